@@ -0,0 +1,359 @@
+"""Prefix autocomplete over product and category names.
+
+Names are normalized (accents stripped, case folded, punctuation collapsed)
+and indexed from every word start, so "run" matches "Red Running Shoe". Each
+entry carries a popularity weight:
+
+- for a product, its number of order lines plus reviews;
+- for a category, its number of active, approved products.
+
+The index is a snapshot file at ``settings.AUTOCOMPLETE_INDEX_PATH``. It
+holds a header, the records sorted by key, an array of their offsets and an
+array of their positions ordered by weight. Every worker process
+memory-maps the same file, so the operating system shares one copy of it.
+
+A lookup binary-searches the prefix range through the offsets array. A
+narrow range is scanned whole. A wide range (a one-letter prefix, say) is
+served by walking the weight order until enough positions fall inside it, so
+a lookup decodes at most about sqrt(limit * entries) records.
+
+Saving or deleting a product or category queues its id. After commit, a
+background thread rewrites a small delta segment next to the snapshot
+(``<path>.delta``), in the same format and under a file lock. The delta
+holds the fresh entries of every object changed since the last merge, plus
+a tombstone (an entry with an empty key) per changed object that hides its
+entries in the main snapshot. A save therefore costs O(changes since the
+last merge), not O(catalog).
+
+Once the delta holds ``settings.AUTOCOMPLETE_DELTA_MAX_ENTRIES`` entries,
+or the main snapshot is ``settings.AUTOCOMPLETE_MERGE_INTERVAL`` seconds
+old, the next refresh merges the delta into a new main snapshot. Files are
+swapped in atomically, and readers notice new files on their next lookup.
+``manage.py build_autocomplete_index`` rebuilds everything from scratch.
+"""
+import functools
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from heapq import nsmallest
+
+from django.conf import settings
+from django.core.files import locks
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ACIX1\n'
+HEADER = struct.Struct('I')
+MAX_KEYS_PER_NAME = 6
+REBUILD = 'all'
+
+_snapshots = {}
+_pending = set()
+_pending_lock = threading.Lock()
+_executor = None
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in text).split())
+
+
+def name_keys(name):
+    """The normalized name from each of its first word starts."""
+    words = normalize(name).split()
+    return [' '.join(words[start:]) for start in range(min(len(words), MAX_KEYS_PER_NAME))]
+
+
+def product_entries(ids=None):
+    products = Product.objects.filter(is_active=True, approval_status='approved')
+    if ids is not None:
+        products = products.filter(pk__in=ids)
+    rows = products.annotate(sales=Count('orderitem')).values_list('pk', 'name', 'rating_count', 'sales')
+    for pk, name, reviews, sales in rows.order_by().iterator(chunk_size=2000):
+        for key in name_keys(name):
+            yield key, sales + reviews, 'product', pk, '', name
+
+
+def category_entries(ids=None):
+    categories = Category.objects.all()
+    if ids is not None:
+        categories = categories.filter(pk__in=ids)
+    listed = Q(products__is_active=True, products__approval_status='approved')
+    rows = categories.annotate(product_count=Count('products', filter=listed)).values_list(
+        'pk', 'slug', 'name', 'product_count'
+    )
+    for pk, slug, name, product_count in rows.order_by():
+        for key in name_keys(name):
+            yield key, product_count, 'category', pk, slug, name
+
+
+class Snapshot:
+    """A memory-mapped snapshot file, indexable by position as sorted keys."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not an autocomplete snapshot')
+        (count,) = HEADER.unpack_from(self.buffer, len(MAGIC))
+        start = len(MAGIC) + HEADER.size
+        view = memoryview(self.buffer)
+        self.offsets = view[start:start + count * 4].cast('I')
+        self.by_weight = view[start + count * 4:start + count * 8].cast('I')
+        self.data = start + count * 8
+
+    @functools.cached_property
+    def removed(self):
+        """The ``(kind, pk)`` of the tombstones, which sort first."""
+        removed = set()
+        for position in range(len(self)):
+            key, _, kind, pk, _, _ = self.record(position)
+            if key:
+                break
+            removed.add((kind, pk))
+        return removed
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, position):
+        start = self.data + self.offsets[position]
+        return self.buffer[start:self.buffer.find(b'\t', start)]
+
+    def record(self, position):
+        start = self.data + self.offsets[position]
+        return self.buffer[start:self.buffer.find(b'\n', start)].decode().split('\t', 5)
+
+    def records(self):
+        """Every entry except the tombstones."""
+        for position in range(len(self.removed), len(self)):
+            yield self.record(position)
+
+
+def write_snapshot(entries, path):
+    """Atomically replace the snapshot at ``path`` with ``entries``."""
+    records = sorted(
+        ('\t'.join((key, str(weight), kind, str(pk), slug, ' '.join(label.split()))).encode() + b'\n', weight)
+        for key, weight, kind, pk, slug, label in entries
+    )
+    lines = [line for line, _ in records]
+    offsets, position = array('I'), 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line)
+    by_weight = array('I', sorted(range(len(records)), key=lambda position: -records[position][1]))
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.autocomplete-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(len(lines)))
+            f.write(offsets.tobytes())
+            f.write(by_weight.tobytes())
+            f.writelines(lines)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return len(lines)
+
+
+def delta_path(path):
+    return f'{path}.delta'
+
+
+def rebuild():
+    """Write a fresh snapshot of every product and category."""
+    path = str(settings.AUTOCOMPLETE_INDEX_PATH)
+    with _file_lock(path):
+        count = write_snapshot([*product_entries(), *category_entries()], path)
+        _remove(delta_path(path))
+        return count
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _parsed(records):
+    return [(key, int(weight), kind, int(pk), slug, label) for key, weight, kind, pk, slug, label in records]
+
+
+def refresh(changes):
+    """Replace the entries of the changed ``(kind, id)`` pairs, through the
+    delta segment."""
+    path = str(settings.AUTOCOMPLETE_INDEX_PATH)
+    if REBUILD in changes or not os.path.exists(path):
+        return rebuild()
+    with _file_lock(path):
+        delta = delta_path(path)
+        changed = set(changes)
+        entries = []
+        if os.path.exists(delta):
+            snapshot = Snapshot(delta)
+            changed.update((kind, int(pk)) for kind, pk in snapshot.removed)
+            entries = [entry for entry in _parsed(snapshot.records()) if (entry[2], entry[3]) not in changes]
+        product_ids = [pk for kind, pk in changes if kind == 'product']
+        category_ids = [pk for kind, pk in changes if kind == 'category']
+        entries += [
+            *(product_entries(product_ids) if product_ids else ()),
+            *(category_entries(category_ids) if category_ids else ()),
+        ]
+
+        age = time.time() - os.stat(path).st_mtime
+        if len(entries) + len(changed) < settings.AUTOCOMPLETE_DELTA_MAX_ENTRIES \
+                and age < settings.AUTOCOMPLETE_MERGE_INTERVAL:
+            tombstones = [('', 0, kind, pk, '', '') for kind, pk in changed]
+            return write_snapshot(tombstones + entries, delta)
+
+        # Merge: until the delta is removed, readers pair the new snapshot
+        # with the old delta, which still hides and supplies the same entries.
+        kept = [
+            entry for entry in _parsed(Snapshot(path).records())
+            if (entry[2], entry[3]) not in changed
+        ]
+        count = write_snapshot(kept + entries, path)
+        _remove(delta)
+        return count
+
+
+class _file_lock:
+    def __init__(self, path):
+        self.path = f'{path}.lock'
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, 'a')
+        locks.lock(self.file, locks.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        locks.unlock(self.file)
+        self.file.close()
+
+
+def _mapped(path):
+    """This process's mapping of the file at ``path``, or None if there is none."""
+    try:
+        stat = os.stat(path)
+        snapshot = _snapshots.get(path)
+        if snapshot is None or snapshot.identity != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            snapshot = _snapshots[path] = Snapshot(path)
+        return snapshot
+    except FileNotFoundError:  # also when replaced between stat() and open()
+        _snapshots.pop(path, None)
+        return None
+
+
+def current_snapshot():
+    """This process's mapping of the latest snapshot, or None before the first build."""
+    snapshot = _mapped(str(settings.AUTOCOMPLETE_INDEX_PATH))
+    if snapshot is None:
+        schedule_refresh(REBUILD)
+    return snapshot
+
+
+def current_delta():
+    return _mapped(delta_path(str(settings.AUTOCOMPLETE_INDEX_PATH)))
+
+
+def matches(snapshot, prefix, limit, removed=frozenset()):
+    """``{(kind, pk): (weight, label, slug)}`` of the heaviest objects with a
+    key starting with ``prefix``: at least ``limit`` of them, if there are."""
+    low = bisect_left(snapshot, prefix, 0, len(snapshot))
+    # No UTF-8 encoded text contains the byte 0xff.
+    high = bisect_left(snapshot, prefix + b'\xff', low, len(snapshot))
+    by_weight = high - low > math.isqrt(limit * len(snapshot))
+    if by_weight:
+        positions = (position for position in snapshot.by_weight if low <= position < high)
+    else:
+        positions = range(low, high)
+
+    best = {}
+    for position in positions:
+        key, weight, kind, pk, slug, label = snapshot.record(position)
+        if (kind, pk) in removed:
+            continue
+        weight = int(weight)
+        # One suggestion per object, however many of its words match.
+        if best.get((kind, pk), (-1,))[0] < weight:
+            best[kind, pk] = (weight, label, slug)
+        if by_weight and len(best) == limit:
+            # Walking the weight order: the first matches are the heaviest.
+            break
+    return best
+
+
+def suggest(query, limit=10):
+    """The heaviest products and categories with a name word starting with ``query``."""
+    prefix = normalize(query).encode()
+    snapshot = current_snapshot() if prefix else None
+    if snapshot is None:
+        return []
+    delta = current_delta()
+    best = matches(snapshot, prefix, limit, delta.removed if delta is not None else frozenset())
+    if delta is not None:
+        # Objects in the delta are tombstoned in the snapshot, so the two
+        # never suggest the same object.
+        best.update(matches(delta, prefix, limit))
+    top = nsmallest(limit, best.items(), key=lambda item: (-item[1][0], item[1][1]))
+    return [
+        {'type': kind, 'id': int(pk), 'slug': slug or None, 'name': label, 'weight': weight}
+        for (kind, pk), (weight, label, slug) in top
+    ]
+
+
+def _flush():
+    with _pending_lock:
+        changes = set(_pending)
+        _pending.clear()
+    if changes:
+        try:
+            refresh(changes)
+        except Exception:
+            logger.exception('Refreshing the autocomplete index failed')
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # A single thread, so refreshes of one process never overlap and
+        # changes queued while one runs are merged into the next.
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='autocomplete')
+    return _executor
+
+
+def schedule_refresh(kind, pk=None):
+    """Queue ``(kind, pk)`` (or ``REBUILD``) for the next refresh after commit."""
+    change = REBUILD if kind == REBUILD else (kind, pk)
+
+    def enqueue():
+        with _pending_lock:
+            _pending.add(change)
+        if getattr(settings, 'AUTOCOMPLETE_REFRESH_IN_BACKGROUND', True):
+            get_executor().submit(_flush)
+        else:
+            _flush()
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,511 @@
+"""Bulk product import and export.
+
+Files are CSV (one product per line; ``variants`` holds a JSON list) or JSON
+Lines (one product object per line). Both directions stream: uploads are read
+line by line and handled in batches, and exports are generated from a
+server-side cursor in chunks, so memory use does not grow with the file.
+
+Each import batch is validated row by row, then written with one
+``bulk_create`` for the products and one for their variants. Slugs are made
+unique for the whole batch with a couple of queries instead of one per row.
+A batch that loses a slug to a concurrent import is allocated afresh up to
+``SLUG_ATTEMPTS`` times, then written row by row so only the rows that keep
+colliding are rejected.
+
+``ProductSync`` applies a vendor's full feed instead: rows are compared with
+the stored per-row content hashes and only inserts, changes and
+deactivations are written.
+"""
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+
+from . import autocomplete, caching
+from .facets import PRODUCT_FACETS
+from .models import Category, Product, ProductVariant
+from .serializers import ProductImportSerializer
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+EXPORT_FIELDS = ('slug', 'name', 'description', 'price', 'stock', 'category', 'is_active', 'variants')
+
+# Room left in the 50 character slug column for a "-<n>" suffix.
+SLUG_BASE_LENGTH = 40
+SLUG_ATTEMPTS = 3
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(filename, requested=None):
+    file_format = (requested or filename.rsplit('.', 1)[-1]).lower()
+    if file_format == 'ndjson':
+        file_format = 'jsonl'
+    if file_format not in FORMATS:
+        raise ImportFormatError(f"Unsupported format '{file_format}', expected one of: {', '.join(FORMATS)}")
+    return file_format
+
+
+def read_rows(lines, file_format):
+    """Yield one dict per product from an iterable of encoded lines."""
+    text = (line.decode('utf-8-sig') if isinstance(line, bytes) else line for line in lines)
+    if file_format == 'csv':
+        for row in csv.DictReader(text):
+            row = {key: value for key, value in row.items() if key is not None and value != ''}
+            if 'variants' in row:
+                try:
+                    row['variants'] = json.loads(row['variants'])
+                except ValueError:
+                    pass  # reported as a validation error for the row
+            yield row
+    else:
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else {'_invalid': line}
+
+
+def _batches(rows, size):
+    batch = []
+    for number, row in enumerate(rows, start=1):
+        batch.append((number, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _category_ids():
+    ids = {}
+    for pk, slug in Category.objects.values_list('pk', 'slug'):
+        ids[str(pk)] = ids[slug] = pk
+    return ids
+
+
+class SlugAllocator:
+    """Hands out unique product slugs.
+
+    ``reserve()`` checks a whole batch of candidate slugs with one query; the
+    numbered ``<base>-<n>`` slugs of a base are only loaded once that base
+    turns out to be taken.
+    """
+
+    def __init__(self):
+        self.taken = set()
+        self.checked = set()
+        self.expanded = set()
+        self.suffixes = {}
+
+    def reserve(self, slugs):
+        unchecked = set(slugs) - self.checked
+        if unchecked:
+            self.checked |= unchecked
+            self.taken.update(Product.objects.filter(slug__in=unchecked).values_list('slug', flat=True))
+
+    def allocate(self, base):
+        if base in self.taken and base not in self.expanded:
+            self.expanded.add(base)
+            self.taken.update(
+                Product.objects.filter(slug__startswith=f'{base}-').values_list('slug', flat=True)
+            )
+        slug, suffix = base, self.suffixes.get(base, 1)
+        while slug in self.taken:
+            suffix += 1
+            slug = f'{base}-{suffix}'
+        self.suffixes[base] = suffix
+        self.taken.add(slug)
+        return slug
+
+
+def slug_base(name):
+    return slugify(name)[:SLUG_BASE_LENGTH].strip('-') or 'product'
+
+
+class ProductImporter:
+    """Create products for one vendor from an iterable of row dicts.
+
+    ``run()`` returns a report with the number of products and variants
+    created and, for every rejected row, its 1-based row number and the
+    validation errors.
+    """
+
+    def __init__(self, vendor, batch_size=500):
+        self.vendor = vendor
+        self.batch_size = batch_size
+        self.categories = _category_ids()
+        # One instance validates every row, so its fields are only built once.
+        self.serializer = ProductImportSerializer()
+        self.slugs = SlugAllocator()
+        self.report = {'created': 0, 'variants': 0, 'errors': []}
+        self.touched_categories = set()
+
+    def validate(self, row):
+        if '_invalid' in row:
+            return None, {'non_field_errors': ['Row is not a JSON object.']}
+        try:
+            data = self.serializer.run_validation(row)
+        except ValidationError as e:
+            return None, e.detail
+        category_id = self.categories.get(data['category'].strip())
+        if category_id is None:
+            return None, {'category': [f"Unknown category '{data['category']}'."]}
+        data['category'] = category_id
+        return data, None
+
+    def build(self, rows):
+        explicit = {data['slug'] for number, data in rows if data.get('slug')}
+        self.slugs.reserve(explicit | {slug_base(data['name']) for number, data in rows})
+
+        products, variants, errors = [], [], []
+        for number, data in rows:
+            slug = data.get('slug')
+            if slug:
+                if slug in self.slugs.taken:
+                    errors.append({'row': number, 'errors': {'slug': ['Slug is already in use.']}})
+                    continue
+                self.slugs.taken.add(slug)
+            else:
+                slug = self.slugs.allocate(slug_base(data['name']))
+            products.append(self.new_product(data, slug))
+            variants.append(data.get('variants') or [])
+        return products, variants, errors
+
+    def new_product(self, data, slug, pk=None):
+        product = Product(
+            pk=pk,
+            vendor=self.vendor,
+            category_id=data['category'],
+            name=data['name'],
+            slug=slug,
+            description=data['description'],
+            price=data['price'],
+            stock=data['stock'],
+            is_active=data['is_active'],
+        )
+        product.content_hash = product.compute_content_hash()
+        return product
+
+    def new_variant(self, product, data):
+        variant = ProductVariant(product=product, **data)
+        variant.content_hash = variant.compute_content_hash()
+        return variant
+
+    def write(self, products, variants):
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            created_variants = ProductVariant.objects.bulk_create([
+                self.new_variant(product, variant)
+                for product, product_variants in zip(products, variants)
+                for variant in product_variants
+            ])
+        self.touched_categories.update(product.category_id for product in products)
+        return len(created_variants)
+
+    def import_batch(self, batch):
+        valid = []
+        for number, row in batch:
+            data, row_errors = self.validate(row)
+            if row_errors:
+                self.report['errors'].append({'row': number, 'errors': row_errors})
+            else:
+                valid.append((number, data))
+        if not valid:
+            return
+        if self.write_rows(valid):
+            return
+        for number, data in valid:
+            if not self.write_rows([(number, data)]):
+                self.report['errors'].append({
+                    'row': number,
+                    'errors': {'slug': ['Slug was taken by a concurrent import, please retry.']},
+                })
+
+    def write_rows(self, rows):
+        """Build and write ``rows``, allocating their slugs afresh while
+        another writer takes them first; False once ``SLUG_ATTEMPTS`` runs out."""
+        for attempt in range(SLUG_ATTEMPTS):
+            products, variants, errors = self.build(rows)
+            try:
+                created_variants = self.write(products, variants)
+            except IntegrityError:
+                # Another writer took one of the slugs after they were
+                # checked: forget the cached slugs.
+                self.slugs = SlugAllocator()
+                continue
+            self.report['created'] += len(products)
+            self.report['variants'] += created_variants
+            self.report['errors'].extend(errors)
+            return True
+        return False
+
+    def run(self, rows):
+        try:
+            for batch in _batches(rows, self.batch_size):
+                self.import_batch(batch)
+        finally:
+            if self.report['created']:
+                # bulk_create sends no post_save signals, so drop the cached
+                # responses and refresh the indexes the signal handlers would have.
+                autocomplete.schedule_refresh(autocomplete.REBUILD)
+                caching.invalidate(
+                    caching.CATEGORY_TREE, PRODUCT_FACETS, 'product-list',
+                    f'vendor:{self.vendor.pk}',
+                    *(f'category:{pk}' for pk in self.touched_categories),
+                )
+        return self.report
+
+
+class ProductSync(ProductImporter):
+    """Apply a vendor's full product feed, writing only what changed.
+
+    Every feed row must carry the product's ``slug``, which identifies it
+    within the vendor's catalog. The incoming row is reduced to the same
+    ``content_hash`` the stored row carries: equal hashes are skipped without
+    a write, differing ones are applied with one ``bulk_update`` per batch
+    and new slugs are created. Variants are matched by (name, value) and
+    treated the same way when a row includes ``variants``; variants missing
+    from such a row are zeroed out. After the feed, the vendor's active
+    products it did not mention are deactivated (unless disabled).
+
+    Stored rows with an empty hash (written through ``queryset.update()``)
+    are loaded and hashed from their current values instead.
+    """
+    PRODUCT_UPDATE_FIELDS = (*Product.CONTENT_FIELDS, 'content_hash', 'updated_at')
+    VARIANT_UPDATE_FIELDS = (*ProductVariant.CONTENT_FIELDS, 'content_hash')
+
+    def __init__(self, vendor, batch_size=500, deactivate_missing=True):
+        super().__init__(vendor, batch_size)
+        self.deactivate_missing = deactivate_missing
+        self.report = {
+            'created': 0, 'updated': 0, 'unchanged': 0, 'deactivated': 0,
+            'variants': {'created': 0, 'updated': 0, 'deactivated': 0},
+            'errors': [],
+        }
+        self.existing = {
+            slug: (pk, content_hash, category_id)
+            for slug, pk, content_hash, category_id in Product.objects.filter(
+                vendor=vendor
+            ).values_list('slug', 'pk', 'content_hash', 'category_id')
+        }
+        self.seen = set()
+        self.changed = set()
+
+    def stored_hashes(self, pks):
+        """Stored product hashes, computing the ones that are not known."""
+        hashes = {}
+        unknown = []
+        for slug, pk in pks.items():
+            content_hash = self.existing[slug][1]
+            if content_hash:
+                hashes[pk] = content_hash
+            else:
+                unknown.append(pk)
+        if unknown:
+            fields = [Product._meta.get_field(name).attname for name in Product.CONTENT_FIELDS]
+            for product in Product.objects.filter(pk__in=unknown).only(*fields):
+                hashes[product.pk] = product.compute_content_hash()
+        return hashes
+
+    def sync_variants(self, product, incoming, stored):
+        """Return the variants to create, update and zero out to turn
+        ``stored`` into ``incoming``."""
+        created, updated, zeroed = [], [], []
+        current = {(variant.name, variant.value): variant for variant in stored}
+        for data in incoming:
+            variant = self.new_variant(product, data)
+            existing = current.pop((variant.name, variant.value), None)
+            if existing is None:
+                created.append(variant)
+            elif (existing.content_hash or existing.compute_content_hash()) != variant.content_hash:
+                variant.pk = existing.pk
+                updated.append(variant)
+        for variant in current.values():
+            if variant.stock:
+                variant.stock = 0
+                variant.content_hash = variant.compute_content_hash()
+                zeroed.append(variant)
+        return created, updated, zeroed
+
+    def import_batch(self, batch):
+        rows = []
+        for number, row in batch:
+            if isinstance(row.get('slug'), str):
+                # A product named by the feed is never deactivated, even if
+                # its row is rejected.
+                self.seen.add(row['slug'])
+            data, row_errors = self.validate(row)
+            if not row_errors and not data.get('slug'):
+                row_errors = {'slug': ['This field is required for sync.']}
+            if row_errors:
+                self.report['errors'].append({'row': number, 'errors': row_errors})
+            else:
+                rows.append((number, data))
+
+        new_rows = [(number, data) for number, data in rows if data['slug'] not in self.existing]
+        self.slugs.reserve(data['slug'] for number, data in new_rows)
+        existing = {
+            data['slug']: self.existing[data['slug']][0]
+            for number, data in rows if data['slug'] in self.existing
+        }
+        hashes = self.stored_hashes(existing)
+        stored_variants = {}
+        for variant in ProductVariant.objects.filter(product_id__in=existing.values()):
+            stored_variants.setdefault(variant.product_id, []).append(variant)
+
+        created, created_variants = [], []
+        updated, touched = [], []
+        variant_creates, variant_updates, variant_zeroed = [], [], []
+        now = timezone.now()
+        for number, data in rows:
+            slug = data['slug']
+            if slug not in self.existing:
+                if slug in self.slugs.taken:
+                    self.report['errors'].append({'row': number, 'errors': {'slug': ['Slug is already in use.']}})
+                    continue
+                self.slugs.taken.add(slug)
+                created.append(self.new_product(data, slug))
+                created_variants.append(data.get('variants') or [])
+                continue
+
+            pk = existing[slug]
+            product = self.new_product(data, slug, pk=pk)
+            variants_changed = False
+            if 'variants' in data:
+                new, changed, zeroed = self.sync_variants(
+                    product, data['variants'], stored_variants.get(pk, [])
+                )
+                variant_creates += new
+                variant_updates += changed
+                variant_zeroed += zeroed
+                variants_changed = bool(new or changed or zeroed)
+            if product.content_hash != hashes[pk]:
+                product.updated_at = now
+                updated.append(product)
+            elif variants_changed:
+                touched.append(pk)
+            else:
+                self.report['unchanged'] += 1
+
+        if created or updated or touched:
+            with transaction.atomic():
+                if created:
+                    self.report['variants']['created'] += self.write(created, created_variants)
+                Product.objects.bulk_update(updated, self.PRODUCT_UPDATE_FIELDS)
+                ProductVariant.objects.bulk_create(variant_creates)
+                ProductVariant.objects.bulk_update(
+                    variant_updates + variant_zeroed, self.VARIANT_UPDATE_FIELDS
+                )
+                if touched:
+                    Product.objects.filter(pk__in=touched).update(updated_at=now)
+
+        for product in created:
+            self.existing[product.slug] = (product.pk, product.content_hash, product.category_id)
+        for product in updated:
+            old_category = self.existing[product.slug][2]
+            self.existing[product.slug] = (product.pk, product.content_hash, product.category_id)
+            self.touched_categories.update((old_category, product.category_id))
+        self.changed.update(product.pk for product in updated)
+        self.changed.update(touched)
+        self.report['created'] += len(created)
+        self.report['updated'] += len(updated)
+        self.report['variants']['created'] += len(variant_creates)
+        self.report['variants']['updated'] += len(variant_updates)
+        self.report['variants']['deactivated'] += len(variant_zeroed)
+
+    def deactivate(self):
+        missing = [
+            (pk, category_id)
+            for slug, (pk, content_hash, category_id) in self.existing.items()
+            if slug not in self.seen
+        ]
+        now = timezone.now()
+        for start in range(0, len(missing), self.batch_size):
+            chunk = dict(missing[start:start + self.batch_size])
+            pks = list(
+                Product.objects.filter(pk__in=chunk, is_active=True).values_list('pk', flat=True)
+            )
+            # is_active is part of the content hash; mark it unknown.
+            Product.objects.filter(pk__in=pks).update(is_active=False, content_hash='', updated_at=now)
+            self.report['deactivated'] += len(pks)
+            self.changed.update(pks)
+            self.touched_categories.update(chunk[pk] for pk in pks)
+
+    def run(self, rows):
+        try:
+            for batch in _batches(rows, self.batch_size):
+                self.import_batch(batch)
+            if self.deactivate_missing:
+                self.deactivate()
+        finally:
+            if self.report['created'] or self.changed:
+                autocomplete.schedule_refresh(autocomplete.REBUILD)
+                caching.invalidate(
+                    caching.CATEGORY_TREE, PRODUCT_FACETS, 'product-list',
+                    f'vendor:{self.vendor.pk}',
+                    *(f'product:{pk}' for pk in self.changed),
+                    *(f'category:{pk}' for pk in self.touched_categories),
+                )
+        return self.report
+
+
+def _export_row(product):
+    return {
+        'slug': product.slug,
+        'name': product.name,
+        'description': product.description,
+        'price': str(product.price),
+        'stock': product.stock,
+        'category': product.category.slug,
+        'is_active': product.is_active,
+        'variants': [
+            {
+                'name': variant.name,
+                'value': variant.value,
+                'price_adjustment': str(variant.price_adjustment),
+                'stock': variant.stock,
+            }
+            for variant in product.variants.all()
+        ],
+    }
+
+
+def export_products(queryset, file_format, chunk_size=1000):
+    """Yield the products of ``queryset`` as CSV or JSON Lines text chunks."""
+    queryset = (
+        queryset.select_related('category')
+        .prefetch_related('variants')
+        .only('slug', 'name', 'description', 'price', 'stock', 'is_active', 'category__slug')
+        .order_by('pk')
+    )
+    buffer = io.StringIO()
+    writer = None
+    if file_format == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    for count, product in enumerate(queryset.iterator(chunk_size=chunk_size), start=1):
+        row = _export_row(product)
+        if writer is not None:
+            row['variants'] = json.dumps(row['variants']) if row['variants'] else ''
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row) + '\n')
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,153 @@
+"""Cache helpers for rendered catalog data.
+
+Cached entries are tied to one or more version tokens ("groups" or "tags");
+invalidating a tag just replaces its token, so every entry that depends on it
+is dropped at once without having to enumerate keys. This works the same on
+the per-process locmem cache and on a shared backend.
+"""
+import functools
+import hashlib
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+CATEGORY_TREE = 'category-tree'
+CATEGORY_TREE_TIMEOUT = 60 * 60
+
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+RESPONSE_CACHE_HITS = 'response-cache:hits'
+RESPONSE_CACHE_MISSES = 'response-cache:misses'
+
+
+def _version_key(group):
+    return f'{group}:version'
+
+
+def get_version(group):
+    version = cache.get(_version_key(group))
+    if version is None:
+        cache.add(_version_key(group), uuid4().hex, None)
+        version = cache.get(_version_key(group))
+    return version
+
+
+def get_versions(groups):
+    keys = {_version_key(group): group for group in groups}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, uuid4().hex, None)
+        found[key] = cache.get(key)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def invalidate(*groups):
+    cache.set_many({_version_key(group): uuid4().hex for group in groups}, None)
+
+
+def versioned_key(group, *parts):
+    return ':'.join([group, get_version(group), *map(str, parts)])
+
+
+def _count(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:  # evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def response_cache_stats():
+    hits = cache.get(RESPONSE_CACHE_HITS) or 0
+    misses = cache.get(RESPONSE_CACHE_MISSES) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
+
+
+def response_cache_key(request):
+    params = sorted(
+        (name, value)
+        for name in request.query_params.keys()
+        for value in request.query_params.getlist(name)
+    )
+    raw = f'{request.build_absolute_uri(request.path)}?{urlencode(params)}'
+    return 'response:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def response_etag(key, tags):
+    """ETag of a cached response: it changes whenever one of the versions of
+    ``tags`` (``{tag: version}``) does."""
+    return quote_etag(hashlib.sha1(repr((key, sorted(tags.items()))).encode()).hexdigest())
+
+
+def cache_response(view_method):
+    """Cache the data of a successful GET response.
+
+    The view must implement ``get_cache_tags(request, data)``. A stored entry
+    is served only while every tag still has the version it was stored
+    with; signal handlers invalidate tags when the underlying rows change.
+    Responses must not vary by user.
+
+    Responses carry an ETag derived from those versions and stored with the
+    entry, so a matching ``If-None-Match`` is answered with 304 from the
+    cache alone.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return view_method(self, request, *args, **kwargs)
+
+        key = response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and 'etag' in entry and get_versions(entry['tags']) == entry['tags']:
+            _count(RESPONSE_CACHE_HITS)
+            response = Response(entry['data'], status=entry['status'], headers={'X-Cache': 'HIT'})
+            response['ETag'] = entry['etag']
+            return get_conditional_response(request, etag=entry['etag'], response=response)
+
+        _count(RESPONSE_CACHE_MISSES)
+        response = view_method(self, request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        if response.status_code != 200:
+            return response
+        tags = get_versions(self.get_cache_tags(request, response.data))
+        etag = response_etag(key, tags)
+        cache.set(
+            key,
+            {'data': response.data, 'status': response.status_code, 'tags': tags, 'etag': etag},
+            RESPONSE_CACHE_TIMEOUT,
+        )
+        response['ETag'] = etag
+        return get_conditional_response(request, etag=etag, response=response)
+    return wrapper
+
+
+def response_rows(data):
+    """The serialized objects in a (possibly paginated) response body."""
+    if isinstance(data, dict) and 'results' in data:
+        return data['results']
+    if isinstance(data, dict):
+        return [data]
+    return data
+
+
+class CachedReadMixin:
+    """Serve ``list`` and ``retrieve`` through the tagged response cache."""
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_cache_tags(self, request, data):
+        raise NotImplementedError
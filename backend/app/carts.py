@@ -0,0 +1,200 @@
+"""Cart mutations.
+
+``add_items`` adds any number of ``{product, variant, quantity}`` lines with a
+fixed number of queries:
+
+- one query to validate the products, and one for the variants;
+- one query to find the lines already in the cart;
+- one ``UPDATE`` that increments those lines with ``F('quantity') + n``;
+- one ``bulk_create`` for the new lines.
+
+The cart row is locked for the duration of the write, so concurrent adds to
+one cart are serialized rather than lost, and the unique constraints on
+``CartItem`` guarantee a single line per product and variant.
+
+Visitors who are not logged in get a ``GuestCart`` instead. It lives in the
+Django cache, with no database writes, under a random id that the client
+holds as a signed token (the ``X-Guest-Cart`` header). It expires
+``settings.GUEST_CART_TTL`` seconds after its last change.
+``merge_guest_cart`` folds it into the user's ``Cart`` at login, in one
+batched transaction.
+"""
+from collections import Counter
+from decimal import Decimal
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Cart, CartItem, Product, ProductVariant
+
+MAX_QUANTITY = 1000
+GUEST_CART_HEADER = 'X-Guest-Cart'
+GUEST_CART_SALT = 'app.carts.guest'
+
+
+def line_errors(lines):
+    """Per-line error dicts (empty for valid lines), or None if every line is valid."""
+    product_ids = {line['product'] for line in lines}
+    variant_ids = {line['variant'] for line in lines if line.get('variant') is not None}
+    available = set(
+        Product.objects.filter(pk__in=product_ids, is_active=True, approval_status='approved')
+        .values_list('pk', flat=True)
+    )
+    variants = dict(
+        ProductVariant.objects.filter(pk__in=variant_ids).values_list('pk', 'product_id')
+    ) if variant_ids else {}
+
+    errors = []
+    for line in lines:
+        if line['product'] not in available:
+            errors.append({'product': ['Product not found.']})
+        elif line.get('variant') is not None and variants.get(line['variant']) != line['product']:
+            errors.append({'variant': ['Variant not found for this product.']})
+        else:
+            errors.append({})
+    return errors if any(errors) else None
+
+
+def add_items(cart, lines):
+    """Add validated ``lines`` to ``cart``, merging them with the lines it has.
+
+    Returns per-line errors and writes nothing if any line is invalid.
+    """
+    errors = line_errors(lines)
+    if errors:
+        return errors
+    _merge_lines(cart, lines)
+    return None
+
+
+def _merge_lines(cart, lines):
+    quantities = Counter()
+    for line in lines:
+        quantities[line['product'], line.get('variant')] += line['quantity']
+
+    with transaction.atomic():
+        Cart.objects.select_for_update().get(pk=cart.pk)
+        existing = {
+            (product_id, variant_id): pk
+            for pk, product_id, variant_id in CartItem.objects.filter(
+                cart=cart, product_id__in={product_id for product_id, _ in quantities}
+            ).values_list('pk', 'product_id', 'variant_id')
+        }
+        increments = {existing[key]: quantity for key, quantity in quantities.items() if key in existing}
+        if increments:
+            CartItem.objects.filter(pk__in=increments).update(quantity=F('quantity') + Case(
+                *[When(pk=pk, then=Value(quantity)) for pk, quantity in increments.items()],
+                output_field=IntegerField(),
+            ))
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, variant_id=variant_id, quantity=quantity)
+            for (product_id, variant_id), quantity in quantities.items()
+            if (product_id, variant_id) not in existing
+        ])
+        # Bulk writes send no signals, so the cart is touched here (see
+        # app.signals.touch_cart) to keep its ETag and Last-Modified current.
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+
+class GuestCart:
+    """An anonymous visitor's cart, serializable with ``CartSerializer``."""
+    id = None
+    user = None
+
+    def __init__(self, token=None):
+        self.key, data = None, None
+        if token:
+            try:
+                self.key = signing.Signer(salt=GUEST_CART_SALT).unsign(token)
+            except (signing.BadSignature, TypeError):
+                # Forged, stale or not a string at all (e.g. a number in a
+                # JSON body): start an empty cart.
+                pass
+        if self.key:
+            data = cache.get(self.cache_key)
+        if data is None:
+            self.key = None
+            data = {'created_at': timezone.now(), 'lines': []}
+        self.created_at = data['created_at']
+        self.quantities = Counter({(product, variant): quantity for product, variant, quantity in data['lines']})
+
+    @property
+    def cache_key(self):
+        return f'guest-cart:{self.key}'
+
+    @property
+    def token(self):
+        return signing.Signer(salt=GUEST_CART_SALT).sign(self.key) if self.key else None
+
+    @property
+    def lines(self):
+        return [
+            {'product': product, 'variant': variant, 'quantity': quantity}
+            for (product, variant), quantity in self.quantities.items()
+        ]
+
+    def add(self, lines):
+        for line in lines:
+            key = (line['product'], line.get('variant'))
+            self.quantities[key] = min(self.quantities[key] + line['quantity'], MAX_QUANTITY)
+        self.__dict__.pop('items', None)
+
+    def replace(self, lines):
+        self.quantities.clear()
+        self.add(lines)
+
+    def save(self):
+        if self.key is None:
+            self.key = uuid4().hex
+        lines = [[product, variant, quantity] for (product, variant), quantity in self.quantities.items()]
+        cache.set(self.cache_key, {'created_at': self.created_at, 'lines': lines}, settings.GUEST_CART_TTL)
+
+    def delete(self):
+        if self.key is not None:
+            cache.delete(self.cache_key)
+        self.quantities.clear()
+        self.__dict__.pop('items', None)
+
+    @cached_property
+    def items(self):
+        """Unsaved ``CartItem``s of the lines still available, from two queries."""
+        products = Product.objects.filter(
+            pk__in={product for product, _ in self.quantities}, is_active=True, approval_status='approved'
+        ).only('pk', 'name', 'price').in_bulk()
+        variant_ids = {variant for _, variant in self.quantities if variant is not None}
+        variants = ProductVariant.objects.filter(pk__in=variant_ids).only(
+            'pk', 'product_id', 'name', 'value', 'price_adjustment'
+        ).in_bulk() if variant_ids else {}
+        items = []
+        for (product_id, variant_id), quantity in self.quantities.items():
+            product, variant = products.get(product_id), variants.get(variant_id)
+            if product is None or (variant_id is not None and (variant is None or variant.product_id != product_id)):
+                continue
+            items.append(CartItem(product=product, variant=variant, quantity=quantity))
+        return items
+
+    @property
+    def total_amount(self):
+        return sum((item.subtotal for item in self.items), Decimal('0.00'))
+
+
+def merge_guest_cart(user, token):
+    """Fold the guest cart behind ``token`` into ``user``'s cart, dropping
+    lines that can no longer be ordered; returns the number of lines merged."""
+    guest = GuestCart(token)
+    lines = guest.lines
+    if not lines:
+        return 0
+    errors = line_errors(lines) or [{}] * len(lines)
+    lines = [line for line, error in zip(lines, errors) if not error]
+    if lines:
+        cart, _ = Cart.objects.get_or_create(user=user)
+        _merge_lines(cart, lines)
+    guest.delete()
+    return len(lines)
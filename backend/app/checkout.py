@@ -0,0 +1,109 @@
+"""Turning a cart into an order.
+
+``place_order`` runs in one transaction:
+
+1. It locks the cart row, so a double-submitted checkout waits and then finds
+   the cart empty.
+2. It reads every line with its current price, variant and vendor commission
+   rate in one query.
+3. It releases the cart's stock reservations (see app.reservations). It then
+   decrements stock with conditional ``UPDATE ... WHERE stock >= reserved + n``
+   statements, in id order. A concurrent checkout cannot oversell: the second
+   update of a row waits for the first and then re-checks the condition.
+4. It creates the order and its items with ``bulk_create`` and clears the
+   cart.
+
+Any shortfall rolls everything back.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import caching
+from .facets import PRODUCT_FACETS
+from .models import Cart, CartItem, Order, OrderItem, Product, ProductVariant, StockReservation
+from .reservations import OutOfStock, line_quantities, release
+
+
+def _decrement(model, quantities):
+    """Take ``quantities`` ({pk: n}) off ``model.stock``, leaving reserved
+    units alone; returns the pks short of stock."""
+    short = []
+    for pk, quantity in sorted(quantities.items()):
+        updated = model.objects.filter(pk=pk, stock__gte=F('reserved') + quantity).update(
+            stock=F('stock') - quantity,
+            # Stock is part of content_hash, which update() cannot recompute.
+            content_hash='',
+            **({'updated_at': timezone.now()} if model is Product else {}),
+        )
+        if not updated:
+            short.append(pk)
+    return short
+
+
+def place_order(cart, shipping_address, notes=''):
+    """Place an order for everything in ``cart``; returns the ``Order``."""
+    with transaction.atomic():
+        Cart.objects.select_for_update().get(pk=cart.pk)
+        items = list(
+            CartItem.objects.filter(cart=cart)
+            .select_related('product__vendor', 'variant')
+            .order_by('pk')
+        )
+        if not items:
+            raise ValidationError({'cart': 'The cart is empty.'})
+
+        errors = [
+            f'{item.product.name} can no longer be ordered.' for item in items
+            if not item.product.is_active or item.product.approval_status != 'approved'
+            or (item.variant is not None and item.variant.product_id != item.product_id)
+        ] + [
+            f'Invalid quantity for {item.product.name}.' for item in items if item.quantity < 1
+        ]
+        if errors:
+            raise ValidationError({'items': errors})
+
+        # The held units become available to this transaction only: the
+        # released rows stay locked until it commits.
+        release(StockReservation.objects.filter(cart=cart))
+        product_quantities, variant_quantities = line_quantities(
+            (item.product_id, item.variant_id, item.quantity) for item in items
+        )
+        short_products = _decrement(Product, product_quantities)
+        short_variants = _decrement(ProductVariant, variant_quantities)
+        if short_products or short_variants:
+            raise OutOfStock({
+                'detail': OutOfStock.default_detail,
+                'products': short_products,
+                'variants': short_variants,
+            })
+
+        lines = []
+        for item in items:
+            price = item.product.price
+            if item.variant is not None:
+                price += item.variant.price_adjustment
+            lines.append((item, price))
+        order = Order.objects.create(
+            user_id=cart.user_id,
+            total_amount=sum(price * item.quantity for item, price in lines),
+            shipping_address=shipping_address,
+            notes=notes,
+        )
+        order_items = []
+        for item, price in lines:
+            platform_fee, vendor_earning = OrderItem.split(price, item.product.vendor.commission_rate)
+            order_items.append(OrderItem(
+                order=order, product=item.product, variant=item.variant,
+                quantity=item.quantity, price=price,
+                platform_fee=platform_fee, vendor_earning=vendor_earning,
+            ))
+        OrderItem.objects.bulk_create(order_items)
+        CartItem.objects.filter(cart=cart).delete()
+
+        # The stock updates sent no post_save signals.
+        transaction.on_commit(lambda: caching.invalidate(
+            'product-list', PRODUCT_FACETS, *(f'product:{pk}' for pk in product_quantities)
+        ))
+    return order
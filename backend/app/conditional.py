@@ -0,0 +1,58 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified support for ``list`` and ``retrieve``.
+
+    The validators come from one aggregate query (row count plus the newest
+    of ``last_modified_fields``) over the same rows the response would show,
+    so a matching ``If-None-Match`` / ``If-Modified-Since`` is answered with
+    304 before anything is serialized. Views served through
+    ``caching.cache_response`` get a cheaper ETag from the cache itself and
+    do not use this.
+    """
+    last_modified_fields = ('updated_at',)
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        """Return a tuple describing the response's rows, or None to skip."""
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in kwargs:
+            queryset = queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        aggregates = {
+            f'last_modified_{index}': Max(field)
+            for index, field in enumerate(self.last_modified_fields)
+        }
+        summary = queryset.aggregate(count=Count('pk', distinct=True), **aggregates)
+        if lookup_url_kwarg in kwargs and not summary['count']:
+            return None  # let retrieve() raise its usual 404
+        return tuple(summary[key] for key in sorted(summary))
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        state = self.get_conditional_state(request, *args, **kwargs)
+        if state is None:
+            return handler(request, *args, **kwargs)
+
+        fingerprint = repr((request.build_absolute_uri(), request.user.pk, state))
+        etag = quote_etag(hashlib.sha1(fingerprint.encode()).hexdigest())
+        stamps = [value for value in state if hasattr(value, 'timestamp')]
+        last_modified = int(max(stamps).timestamp()) if stamps else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,120 @@
+"""Facet counts for product listings.
+
+All facets for a filtered product queryset are computed with three grouped
+queries (per category, per vendor, and one conditional aggregate for price
+buckets and availability); category subtree totals are rolled up in memory
+from a cached copy of the category bounds.
+"""
+import hashlib
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import caching
+from .models import Category
+from .search import search_terms
+
+PRODUCT_FACETS = 'product-facets'
+PRODUCT_FACETS_TIMEOUT = 5 * 60
+
+# Upper bounds of the price buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (Decimal('25'), Decimal('50'), Decimal('100'), Decimal('250'), Decimal('500'))
+
+# Query parameters that change the page or its order but not the matching set.
+IGNORED_PARAMS = {'cursor', 'page_size', 'ordering', 'format'}
+
+
+def facet_cache_key(query_params):
+    """Cache key for the normalized filter set of a listing request."""
+    normalized = []
+    for name in sorted(query_params.keys()):
+        if name in IGNORED_PARAMS:
+            continue
+        values = [value.strip() for value in query_params.getlist(name)]
+        if name == 'search':
+            values = [' '.join(search_terms(value)).lower() for value in values]
+        values = sorted(value for value in values if value)
+        normalized.extend((name, value) for value in values)
+    digest = hashlib.sha1(urlencode(normalized).encode()).hexdigest()
+    return caching.versioned_key(PRODUCT_FACETS, digest)
+
+
+def _category_nodes():
+    key = caching.versioned_key(caching.CATEGORY_TREE, 'facet-nodes')
+    nodes = cache.get(key)
+    if nodes is None:
+        nodes = list(Category.objects.values('id', 'name', 'slug', 'parent_id'))
+        cache.set(key, nodes, caching.CATEGORY_TREE_TIMEOUT)
+    return nodes
+
+
+def _price_buckets():
+    lower = Decimal('0')
+    for upper in PRICE_BUCKETS:
+        yield lower, upper
+        lower = upper
+    yield lower, None
+
+
+def compute_product_facets(queryset):
+    queryset = queryset.order_by().prefetch_related(None)
+
+    # Category subtree counts: direct counts, then added to every ancestor.
+    direct = dict(
+        queryset.values('category').annotate(count=Count('id')).values_list('category', 'count')
+    )
+    nodes = _category_nodes()
+    parents = {node['id']: node['parent_id'] for node in nodes}
+    totals = {}
+    for category_id, count in direct.items():
+        while category_id is not None:
+            totals[category_id] = totals.get(category_id, 0) + count
+            category_id = parents.get(category_id)
+    categories = [
+        {
+            'id': node['id'],
+            'name': node['name'],
+            'slug': node['slug'],
+            'parent': node['parent_id'],
+            'count': totals[node['id']],
+        }
+        for node in nodes if node['id'] in totals
+    ]
+
+    vendors = [
+        {
+            'id': row['vendor'],
+            'name': row['vendor__store_name'] or row['vendor__username'],
+            'count': row['count'],
+        }
+        for row in queryset.values(
+            'vendor', 'vendor__store_name', 'vendor__username'
+        ).annotate(count=Count('id')).order_by('-count', 'vendor')
+    ]
+
+    buckets = list(_price_buckets())
+    aggregates = {}
+    for index, (lower, upper) in enumerate(buckets):
+        condition = Q(price__gte=lower)
+        if upper is not None:
+            condition &= Q(price__lt=upper)
+        aggregates[f'price_{index}'] = Count('id', filter=condition)
+    aggregates['in_stock'] = Count('id', filter=Q(stock__gt=0))
+    aggregates['total'] = Count('id')
+    summary = queryset.aggregate(**aggregates)
+
+    return {
+        'total': summary['total'],
+        'categories': categories,
+        'vendors': vendors,
+        'price': [
+            {'min': lower, 'max': upper, 'count': summary[f'price_{index}']}
+            for index, (lower, upper) in enumerate(buckets)
+        ],
+        'availability': {
+            'in_stock': summary['in_stock'],
+            'out_of_stock': summary['total'] - summary['in_stock'],
+        },
+    }
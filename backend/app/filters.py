@@ -0,0 +1,33 @@
+import django_filters
+from django.db.models import Subquery
+
+from .models import Category, Product
+
+
+def category_lookup(value):
+    """Match a category by primary key or slug."""
+    value = str(value).strip()
+    if value.isdigit():
+        return Category.objects.filter(pk=value)
+    return Category.objects.filter(slug=value)
+
+
+class ProductFilter(django_filters.FilterSet):
+    category = django_filters.CharFilter(method='filter_category')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'vendor', 'featured', 'slug']
+
+    def filter_category(self, queryset, name, value):
+        """Products in the given category or any of its descendants.
+
+        Resolved in the same statement as a range join on the category's
+        (tree_id, lft, rght) bounds instead of a list of descendant ids.
+        """
+        target = category_lookup(value).order_by()
+        return queryset.filter(
+            category__tree_id=Subquery(target.values('tree_id')[:1]),
+            category__lft__gte=Subquery(target.values('lft')[:1]),
+            category__rght__lte=Subquery(target.values('rght')[:1]),
+        )
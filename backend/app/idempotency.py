@@ -0,0 +1,136 @@
+"""Idempotency keys for POSTs that create things.
+
+Clients that retry a POST on a timeout send an ``Idempotency-Key`` header.
+The first request with a key claims it by inserting an ``IdempotencyKey``
+row, which is unique per user and key, before the view runs. When the view
+returns, the row stores the response's status and body. A retry with the
+same key gets that response replayed without the view running.
+
+A retry that arrives while the first request is still running polls the row
+until the response is stored. The unique row is the lock, so this works
+across processes and needs no shared cache. It gives up with a 409 after
+``settings.IDEMPOTENCY_KEY_WAIT`` seconds.
+
+A claim left unfinished for ``settings.IDEMPOTENCY_KEY_LEASE`` seconds is
+treated as abandoned, e.g. when the worker died mid-request, and the next
+retry takes it over.
+
+Only successful (2xx) responses are stored. On any error, whether the view
+returns it or raises it, 4xx or 5xx, the claim is dropped and a retry runs
+the view again. The views this wraps write nothing when they fail, so
+re-running them is safe, and a client can retry after a transient error
+(say, a 409 for stock) without minting a new key.
+
+Reusing a key for a different request is a 422. Keys expire after
+``settings.IDEMPOTENCY_KEY_TTL`` seconds, and ``manage.py
+purge_idempotency_keys`` deletes expired rows.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+POLL_INTERVAL = 0.1
+
+
+class RequestInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this idempotency key is still being processed.'
+    default_code = 'idempotency_key_in_use'
+
+
+class KeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This idempotency key was used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):  # QueryDict of a form or multipart body
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def claim(user, key, fingerprint):
+    """``(record, True)`` if this request now owns ``key``, else the existing
+    ``(record, False)``."""
+    abandoned = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+    IdempotencyKey.objects.filter(user=user, key=key).filter(
+        Q(created_at__lt=expired_before()) | Q(status_code__isnull=True, created_at__lt=abandoned)
+    ).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, fingerprint=fingerprint), True
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        # Deleted by a failed first request in between: try again.
+        return (record, False) if record is not None else claim(user, key, fingerprint)
+
+
+def idempotent(view_method):
+    """Make a view method replay its first response to requests repeating an
+    ``Idempotency-Key`` (requests without one run as usual)."""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise ValidationError({HEADER: 'Keys are at most 255 characters long.'})
+
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_KEY_WAIT
+        record, claimed = claim(request.user, key, fingerprint)
+        while not claimed and record.status_code is None and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            record, claimed = claim(request.user, key, fingerprint)
+
+        if not claimed:
+            if record.fingerprint != fingerprint:
+                raise KeyReused()
+            if record.status_code is None:
+                raise RequestInProgress()
+            response = Response(record.body, status=record.status_code)
+            response[REPLAYED_HEADER] = 'true'
+            return response
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        if not status.is_success(response.status_code):
+            record.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, body=response.data
+            )
+        return response
+    return wrapper
+
+
+class IdempotentCreateMixin:
+    """Honour ``Idempotency-Key`` headers on ``create``."""
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
@@ -0,0 +1,190 @@
+"""Resized and WebP derivatives of uploaded images.
+
+For every source image, one derivative is written per width in
+``settings.IMAGE_DERIVATIVE_WIDTHS`` narrower than the source, plus one at
+the source's own width, in two encodings: WebP, plus a JPEG/PNG fallback.
+Images are never upscaled. Derivative names follow a fixed convention next
+to the source (``product_images/derivatives/shoe.jpg/320w.webp`` for
+``product_images/shoe.jpg``).
+
+Once all of an image's derivatives are written, their widths are recorded in
+an ``ImageDerivatives`` row, and ``srcset`` lists only those. An image whose
+derivatives are still pending, failed, or were never backfilled has no
+``srcset``, and clients use the original URL. Recorded widths are cached, so
+serializers rarely touch the database.
+
+Derivatives are generated in a thread pool once the saving transaction
+commits (Pillow releases the GIL while resampling and encoding), and can be
+backfilled with ``manage.py generate_image_derivatives``.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (160, 320, 640, 1280)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+WIDTHS_CACHE_TIMEOUT = 24 * 60 * 60
+# Images without recorded derivatives are looked up again this often.
+PENDING_CACHE_TIMEOUT = 60
+
+_executor = None
+
+
+def derivative_widths():
+    return tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def fallback_extension(name):
+    """PNG sources keep PNG (for transparency); everything else becomes JPEG."""
+    return 'png' if name.lower().endswith('.png') else 'jpg'
+
+
+def derivatives_directory(name):
+    # The full source filename (extension included) names the directory, so
+    # shoe.png and shoe.jpg never share derivatives.
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, 'derivatives', filename)
+
+
+def derivative_name(name, width, extension):
+    return posixpath.join(derivatives_directory(name), f'{width}w.{extension}')
+
+
+def _widths_key(name):
+    return f'image-derivatives:{hashlib.sha1(name.encode()).hexdigest()}'
+
+
+def generated_widths(name):
+    """Widths of the derivatives written for ``name``, smallest first; empty
+    until they have all been written."""
+    key = _widths_key(name)
+    widths = cache.get(key)
+    if widths is None:
+        ImageDerivatives = apps.get_model('app', 'ImageDerivatives')
+        widths = ImageDerivatives.objects.filter(name=name).values_list('widths', flat=True).first() or []
+        cache.set(key, widths, WIDTHS_CACHE_TIMEOUT if widths else PENDING_CACHE_TIMEOUT)
+    return widths
+
+
+def record_widths(name, widths):
+    ImageDerivatives = apps.get_model('app', 'ImageDerivatives')
+    ImageDerivatives.objects.update_or_create(name=name, defaults={'widths': widths})
+    cache.set(_widths_key(name), widths, WIDTHS_CACHE_TIMEOUT)
+
+
+def forget_derivatives(name):
+    """Drop the record of ``name``'s derivatives, e.g. once they are deleted."""
+    apps.get_model('app', 'ImageDerivatives').objects.filter(name=name).delete()
+    cache.delete(_widths_key(name))
+
+
+def srcset(name, request=None):
+    """``srcset`` strings for an image, keyed by encoding; None without an
+    image or before its derivatives exist."""
+    if not name:
+        return None
+    widths = generated_widths(name)
+    if not widths:
+        return None
+
+    def url(path):
+        path = default_storage.url(path)
+        return request.build_absolute_uri(path) if request else path
+
+    def entries(extension):
+        return ', '.join(f'{url(derivative_name(name, width, extension))} {width}w' for width in widths)
+
+    fallback = fallback_extension(name)
+    return {'webp': entries('webp'), fallback: entries(fallback)}
+
+
+def _save(name, image, **params):
+    # Written to a temporary file and renamed over the target, so workers
+    # racing on the same image leave one complete file, not suffixed copies.
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.derivative-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, **params)
+        if default_storage.file_permissions_mode is not None:
+            os.chmod(temp_path, default_storage.file_permissions_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def generate_derivatives(name, force=False):
+    """Write the derivatives of ``name`` unless they are already recorded;
+    returns how many were written."""
+    if not force and generated_widths(name):
+        return 0
+    extension = fallback_extension(name)
+
+    try:
+        with default_storage.open(name, 'rb') as f:
+            source = ImageOps.exif_transpose(Image.open(f))
+            source.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+        logger.warning('Cannot generate derivatives of %s: %s', name, e)
+        return 0
+
+    if extension == 'png':
+        source = source.convert('RGBA')
+        fallback = {'format': 'PNG', 'optimize': True}
+    else:
+        source = source.convert('RGB')
+        fallback = {'format': 'JPEG', 'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+
+    widths = sorted({width for width in derivative_widths() if width < source.width} | {source.width})
+    for width in reversed(widths):
+        if width < source.width:
+            height = max(1, round(source.height * width / source.width))
+            # Each size is reduced from the previous (larger) one.
+            source = source.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        _save(derivative_name(name, width, 'webp'), source, format='WEBP', quality=WEBP_QUALITY, method=4)
+        _save(derivative_name(name, width, extension), source, **fallback)
+    record_widths(name, widths)
+    return 2 * len(widths)
+
+
+def _run(name):
+    try:
+        generate_derivatives(name)
+    except Exception:
+        logger.exception('Generating derivatives of %s failed', name)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+            thread_name_prefix='image-derivatives',
+        )
+    return _executor
+
+
+def schedule_derivatives(name):
+    """Generate derivatives of ``name`` in the worker pool after commit."""
+    if not name:
+        return
+    if not getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2):
+        transaction.on_commit(lambda: _run(name))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run, name))
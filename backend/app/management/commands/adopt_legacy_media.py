@@ -0,0 +1,46 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import IMAGE_FIELDS, MediaBlob
+from app.storage import PREFIX, media_storage
+
+
+class Command(BaseCommand):
+    help = 'Move images stored under legacy names into content-addressed storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-originals', action='store_true',
+            help='Remove the legacy files once every row referencing them has moved',
+        )
+
+    def handle(self, *args, **options):
+        storage = media_storage()
+        legacy = set()
+        for model, field in IMAGE_FIELDS.items():
+            rows = model.objects.exclude(**{f'{field}__startswith': f'{PREFIX}/'}).exclude(**{field: ''})
+            legacy.update(rows.exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct())
+
+        moved, missing, shared = 0, [], {}
+        for name in sorted(legacy):
+            if not default_storage.exists(name):
+                missing.append(name)
+                continue
+            with default_storage.open(name, 'rb') as f:
+                blob = storage.save(name, f)
+            shared.setdefault(blob, []).append(name)
+            # queryset.update() sends no signals; counts are recomputed below.
+            with transaction.atomic():
+                for model, field in IMAGE_FIELDS.items():
+                    model.objects.filter(**{field: name}).update(**{field: blob})
+            if options['delete_originals']:
+                default_storage.delete(name)
+            moved += 1
+
+        MediaBlob.objects.recount()
+        for name in missing:
+            self.stderr.write(f'missing file: {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} files into {len(shared)} blobs; {len(missing)} referenced files were missing'
+        ))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.autocomplete import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the autocomplete snapshot from scratch, refreshing every '
+        'popularity weight (saves only refresh the rows they touch)'
+    )
+
+    def handle(self, *args, **options):
+        entries = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {entries} autocomplete entries to {settings.AUTOCOMPLETE_INDEX_PATH}'
+        ))
@@ -0,0 +1,65 @@
+import os
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from app import caching
+from app.models import CoPurchase, JobCheckpoint, Order, OrderItem
+from app.recommendations import CHECKPOINT, RELATED_PRODUCTS, TOP_K, count_pairs
+
+
+class Command(BaseCommand):
+    help = (
+        'Update the "frequently bought together" table from orders placed since '
+        'the last run (or from every order with --full)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rebuild from every order, e.g. to drop orders cancelled since they were counted',
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Orders per worker task')
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+
+    def baskets(self, after, up_to):
+        items = (
+            OrderItem.objects.filter(order_id__gt=after, order_id__lte=up_to)
+            .exclude(order__status='cancelled')
+            .order_by('order_id')
+            .values_list('order_id', 'product_id')
+        )
+        return [
+            frozenset(product_id for _, product_id in rows)
+            for _, rows in groupby(items.iterator(chunk_size=10000), key=lambda row: row[0])
+        ]
+
+    def handle(self, *args, **options):
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT)
+        after = 0 if options['full'] else checkpoint.position
+        # Fix the upper bound first so orders placed during the run are left
+        # for the next one.
+        up_to = Order.objects.aggregate(last=Max('pk'))['last'] or 0
+        if up_to <= after and not options['full']:
+            self.stdout.write(self.style.SUCCESS('No new orders'))
+            return
+
+        baskets = self.baskets(after, up_to)
+        counts = count_pairs(baskets, options['workers'], options['chunk_size'])
+
+        with transaction.atomic():
+            if options['full']:
+                CoPurchase.objects.all().delete()
+            touched = CoPurchase.objects.add_counts(counts)
+            CoPurchase.objects.rerank(touched, options['top_k'])
+            checkpoint.position = up_to
+            checkpoint.save()
+            transaction.on_commit(lambda: caching.invalidate(RELATED_PRODUCTS))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Counted {len(counts)} product pairs in {len(baskets)} orders; '
+            f'updated neighbours of {len(touched)} products'
+        ))
@@ -0,0 +1,60 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from app import caching
+from app.models import Product, SimilarityDocument
+from app.similarity import (
+    INDEX_FIELDS, SIMILAR_PRODUCTS, TOP_K, build_neighbours, category_paths, document_signature,
+    index_products,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-index the text of products whose name, description, category path or '
+        'listing changed since they were last indexed (or of every product with --full), '
+        'then re-rank the most similar products of the products those changes reach '
+        '(of every product with --full)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        paths = category_paths()
+        indexed = {} if options['full'] else dict(
+            SimilarityDocument.objects.values_list('product_id', 'signature')
+        )
+
+        # Each batch is indexed in its own transaction, so writers elsewhere
+        # only ever wait for one batch.
+        changed = []
+        batch = []
+        rows = Product.objects.values_list(*INDEX_FIELDS)
+        for row in rows.iterator(chunk_size=batch_size):
+            if indexed.get(row[0]) != document_signature(row, paths):
+                batch.append(row)
+            if len(batch) >= batch_size:
+                index_products(batch, paths)
+                changed.extend(row[0] for row in batch)
+                batch = []
+        if batch:
+            index_products(batch, paths)
+            changed.extend(row[0] for row in batch)
+
+        if options['full'] or changed:
+            ranked = build_neighbours(
+                None if options['full'] else changed, options['top_k'], options['workers']
+            )
+            caching.invalidate(SIMILAR_PRODUCTS)
+        else:
+            ranked = 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Re-indexed {len(changed)} products; ranked neighbours of {ranked} products'
+        ))
@@ -0,0 +1,73 @@
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import MediaBlob
+from app.storage import PREFIX, blob_name, media_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs that no row references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Keep unreferenced blobs uploaded more recently than this',
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Recompute reference counts and register untracked files first',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def register_untracked(self, storage):
+        """Add rows for blob files on disk that have none (e.g. interrupted uploads)."""
+        known = set(MediaBlob.objects.values_list('name', flat=True))
+        root = storage.path(PREFIX)
+        untracked = []
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = [name for name in subdirectories if name != 'derivatives']
+            for filename in files:
+                digest, extension = os.path.splitext(filename)
+                if filename.startswith('.') or len(digest) != 64:
+                    continue
+                name = blob_name(digest, extension)
+                if name not in known:
+                    path = os.path.join(directory, filename)
+                    untracked.append(MediaBlob(
+                        name=name,
+                        size=os.path.getsize(path),
+                        last_uploaded_at=datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc),
+                    ))
+        MediaBlob.objects.bulk_create(untracked, batch_size=1000)
+        return len(untracked)
+
+    def handle(self, *args, **options):
+        storage = media_storage()
+        if options['recount']:
+            registered = self.register_untracked(storage)
+            changed = MediaBlob.objects.recount()
+            self.stdout.write(f'Registered {registered} untracked blobs, corrected {changed} reference counts')
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        candidates = MediaBlob.objects.filter(ref_count__lte=0, last_uploaded_at__lt=cutoff)
+        removed = freed = 0
+        for blob in candidates.iterator():
+            if options['dry_run']:
+                removed += 1
+                freed += blob.size
+                continue
+            # Re-check in the DELETE itself, in case the blob was referenced
+            # or uploaded again since it was listed.
+            deleted, _ = MediaBlob.objects.filter(
+                pk=blob.pk, ref_count__lte=0, last_uploaded_at__lt=cutoff
+            ).delete()
+            if deleted:
+                storage.purge(blob.name)
+                removed += 1
+                freed += blob.size
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} blobs ({freed / 1024 / 1024:.1f} MiB)'))
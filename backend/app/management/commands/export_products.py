@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bulk import export_products
+from app.models import Product, User
+
+
+class Command(BaseCommand):
+    help = "Write a vendor's products (or all products) as CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', help='Only export products of this vendor (username)')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output', help='File to write to; defaults to stdout')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['vendor']:
+            try:
+                queryset = queryset.filter(vendor=User.objects.get(username=options['vendor']))
+            except User.DoesNotExist:
+                raise CommandError(f"No user named '{options['vendor']}'")
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in export_products(queryset, options['file_format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
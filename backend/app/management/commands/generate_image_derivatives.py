@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from app.images import generate_derivatives
+from app.models import IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Generate missing resized/WebP derivatives for every stored image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help='Regenerate existing derivatives too')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in IMAGE_FIELDS.items():
+            stored = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            names.update(stored.values_list(field, flat=True).distinct())
+
+        processed = written = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for count in executor.map(
+                lambda name: generate_derivatives(name, force=options['force']), sorted(names)
+            ):
+                processed += 1
+                written += count
+                if processed % 100 == 0:
+                    self.stdout.write(f'{processed}/{len(names)} images')
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} derivatives for {processed} images'))
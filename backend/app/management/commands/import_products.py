@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bulk import ImportFormatError, ProductImporter, detect_format, read_rows
+from app.models import User
+
+
+class Command(BaseCommand):
+    help = 'Create products for a vendor from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('vendor', help='Username of the vendor that will own the products')
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            vendor = User.objects.get(username=options['vendor'], user_type='vendor')
+        except User.DoesNotExist:
+            raise CommandError(f"No vendor named '{options['vendor']}'")
+        try:
+            file_format = detect_format(options['path'], options['file_format'])
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+
+        started = time.monotonic()
+        with open(options['path'], 'rb') as f:
+            report = ProductImporter(vendor, batch_size=options['batch_size']).run(read_rows(f, file_format))
+        elapsed = time.monotonic() - started
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']} products and {report['variants']} variants "
+            f"in {elapsed:.1f}s; {len(report['errors'])} rows rejected"
+        ))
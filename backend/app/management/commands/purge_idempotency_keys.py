@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from app.idempotency import expired_before
+from app.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL'
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=expired_before()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
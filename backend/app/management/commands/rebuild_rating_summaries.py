@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from app.models import RATING_STARS, RATING_SUMMARY_FIELDS, Product, Review
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized rating summary columns on every product from its reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        star_counts = {
+            f'rating_count_{star}': Count('id', filter=Q(rating=star))
+            for star in RATING_STARS
+        }
+        summaries = {
+            row.pop('product'): row
+            for row in Review.objects.values('product').annotate(
+                rating_count=Count('id'),
+                rating_sum=Sum('rating'),
+                **star_counts,
+            ).order_by()
+        }
+
+        updated = 0
+        with transaction.atomic():
+            batch = []
+            for product in Product.objects.only('id', *RATING_SUMMARY_FIELDS).iterator(chunk_size=batch_size):
+                summary = summaries.get(product.pk, {})
+                for field in RATING_SUMMARY_FIELDS:
+                    setattr(product, field, summary.get(field) or 0)
+                batch.append(product)
+                if len(batch) >= batch_size:
+                    Product.objects.bulk_update(batch, RATING_SUMMARY_FIELDS)
+                    updated += len(batch)
+                    batch = []
+            if batch:
+                Product.objects.bulk_update(batch, RATING_SUMMARY_FIELDS)
+                updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating summaries for {updated} products'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(connection)
+        with transaction.atomic():
+            backend.install(connection)
+            backend.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index with {type(backend).__name__}'))
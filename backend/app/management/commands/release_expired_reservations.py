@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Give back the stock held by expired cart reservations, in batches; '
+        'with --interval, keep sweeping every that many seconds'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=None)
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
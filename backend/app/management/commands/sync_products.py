@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bulk import ImportFormatError, ProductSync, detect_format, read_rows
+from app.models import User
+
+
+class Command(BaseCommand):
+    help = "Apply a vendor's full product feed, writing only the products and variants that changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('vendor', help='Username of the vendor the feed belongs to')
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--keep-missing', action='store_true',
+            help='Do not deactivate products that are missing from the feed',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            vendor = User.objects.get(username=options['vendor'], user_type='vendor')
+        except User.DoesNotExist:
+            raise CommandError(f"No vendor named '{options['vendor']}'")
+        try:
+            file_format = detect_format(options['path'], options['file_format'])
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+
+        sync = ProductSync(
+            vendor,
+            batch_size=options['batch_size'],
+            deactivate_missing=not options['keep_missing'],
+        )
+        started = time.monotonic()
+        with open(options['path'], 'rb') as f:
+            report = sync.run(read_rows(f, file_format))
+        elapsed = time.monotonic() - started
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        variants = report['variants']
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced in {elapsed:.1f}s: {report['created']} created, {report['updated']} updated, "
+            f"{report['unchanged']} unchanged, {report['deactivated']} deactivated; variants "
+            f"{variants['created']} created, {variants['updated']} updated, {variants['deactivated']} zeroed; "
+            f"{len(report['errors'])} rows rejected"
+        ))
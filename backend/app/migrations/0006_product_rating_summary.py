@@ -0,0 +1,66 @@
+# Generated by Django 5.0.1 on 2026-10-17 17:54
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Product = apps.get_model('app', 'Product')
+    Review = apps.get_model('app', 'Review')
+    star_counts = {
+        f'rating_count_{star}': Count('id', filter=Q(rating=star))
+        for star in range(1, 6)
+    }
+    rows = Review.objects.values('product').annotate(
+        rating_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **star_counts,
+    ).order_by()
+    for row in rows:
+        Product.objects.filter(pk=row.pop('product')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_alter_user_options_alter_user_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-17 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['tree_id', 'lft', 'rght'], name='app_category_tree_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['tree_id', 'lft'], name='app_category_tree_id_lft_idx'),
+        ),
+    ]
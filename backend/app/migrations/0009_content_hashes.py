@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+    ]
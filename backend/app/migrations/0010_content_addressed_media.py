@@ -0,0 +1,51 @@
+# Generated by Django 5.0.1 on 2026-10-17 19:05
+
+import app.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_content_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_uploaded_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.media_storage, upload_to='category_images/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.media_storage, upload_to='product_images/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=app.storage.media_storage, upload_to='product_images/'),
+        ),
+        migrations.AlterField(
+            model_name='testimonial',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.media_storage, upload_to='testimonial_images/'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.media_storage, upload_to='profile_images/'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_co_purchase_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similarity_document', serialize=False, to='app.product')),
+                ('signature', models.CharField(max_length=40)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveIntegerField()),
+                ('weight', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'product'], name='app_productterm_bucket_idx')],
+                'unique_together': {('product', 'bucket')},
+            },
+        ),
+    ]
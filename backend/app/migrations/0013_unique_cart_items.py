@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:10
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model('app', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart', 'product', 'variant')
+        .annotate(lines=Count('id'), total=Sum('quantity'))
+        .filter(lines__gt=1).order_by()
+    )
+    for duplicate in duplicates:
+        items = CartItem.objects.filter(
+            cart=duplicate['cart'], product=duplicate['product'], variant=duplicate['variant']
+        ).order_by('id')
+        keep = items.first()
+        items.exclude(pk=keep.pk).delete()
+        CartItem.objects.filter(pk=keep.pk).update(quantity=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_product_similarity_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', False)), fields=('cart', 'product', 'variant'), name='unique_cart_item_variant'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', True)), fields=('cart', 'product'), name='unique_cart_item_product'),
+        ),
+    ]
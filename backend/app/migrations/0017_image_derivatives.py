@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_similar_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivatives',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('widths', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,7 +1,18 @@
+import hashlib
+import json
+
 from django.db import models
+from django.db.models import (
+    Count, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Prefetch, Subquery, Sum, Value,
+)
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from django.utils.text import slugify
+from mptt.managers import TreeManager
 from mptt.models import MPTTModel, TreeForeignKey
+from .storage import PREFIX as MEDIA_BLOB_PREFIX, is_blob, media_storage
 from decimal import Decimal
 
 class User(AbstractUser):
@@ -15,7 +26,7 @@ class User(AbstractUser):
     full_name = models.CharField(max_length=255, default='')
     phone = models.CharField(max_length=15, blank=True)
     address = models.TextField(blank=True)
-    profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
+    profile_image = models.ImageField(upload_to='profile_images/', storage=media_storage, blank=True, null=True)
     store_name = models.CharField(max_length=100, blank=True, null=True)  # For vendors
     store_description = models.TextField(blank=True, null=True)  # For vendors
     bank_account = models.CharField(max_length=50, blank=True, null=True)  # For vendors
@@ -44,19 +55,38 @@ class User(AbstractUser):
             self.is_superuser = True
         super().save(*args, **kwargs)
 
+class CategoryManager(TreeManager):
+    def with_product_counts(self, queryset):
+        """Annotate ``product_count``: visible products in each category and
+        all of its descendants, computed in the same query."""
+        return self.add_related_count(
+            queryset, Product, 'category', 'product_count',
+            cumulative=True,
+            extra_filters={'is_active': True, 'approval_status': 'approved'},
+        )
+
 class Category(MPTTModel):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     parent = TreeForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
     description = models.TextField(blank=True)
-    image = models.ImageField(upload_to='category_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='category_images/', storage=media_storage, blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryManager()
+
     class MPTTMeta:
         order_insertion_by = ['name']
 
+    class Meta:
+        indexes = [
+            # Covers the (tree_id, lft, rght) range scans used to select a
+            # category together with all of its descendants.
+            models.Index(fields=['tree_id', 'lft', 'rght'], name='app_category_tree_range_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -65,6 +95,57 @@ class Category(MPTTModel):
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
+RATING_STARS = (1, 2, 3, 4, 5)
+RATING_SUMMARY_FIELDS = ('rating_count', 'rating_sum') + tuple(
+    f'rating_count_{star}' for star in RATING_STARS
+)
+
+def content_digest(instance, fields):
+    """Hash of the normalized values of ``fields`` on a model instance.
+
+    Used to tell whether an incoming catalog row differs from what is stored
+    without comparing (or even loading) every column.
+    """
+    values = []
+    for name in fields:
+        field = instance._meta.get_field(name)
+        value = field.to_python(getattr(instance, field.attname))
+        if isinstance(value, Decimal):
+            value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+        values.append(str(value))
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+class ProductQuerySet(models.QuerySet):
+    def with_rating(self):
+        """Expose the stored rating summary under orderable names."""
+        return self.annotate(
+            # Unrated products sort as 0 so the value is never NULL, which
+            # keyset pagination on this ordering relies on.
+            average_rating=Coalesce(
+                Cast('rating_sum', FloatField()) / NullIf('rating_count', 0), 0.0
+            ),
+            review_count=F('rating_count'),
+        )
+
+    def with_thumbnail(self):
+        """Annotate the path of the primary (else the oldest) gallery image."""
+        images = ProductImage.objects.filter(product=OuterRef('pk')).order_by(
+            '-is_primary', 'created_at', 'pk'
+        )
+        return self.annotate(primary_image=Subquery(images.values('image')[:1]))
+
+    def adjust_rating(self, rating, delta):
+        """Atomically add (delta=1) or remove (delta=-1) a single rating."""
+        updates = {
+            'rating_count': F('rating_count') + delta,
+            'rating_sum': F('rating_sum') + delta * rating,
+            'updated_at': timezone.now(),
+        }
+        if rating in RATING_STARS:
+            field = f'rating_count_{rating}'
+            updates[field] = F(field) + delta
+        return self.update(**updates)
+
 class Product(models.Model):
     APPROVAL_STATUS = (
         ('pending', 'Pending'),
@@ -75,29 +156,75 @@ class Product(models.Model):
     vendor = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'user_type': 'vendor'})
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=200)
-    image = models.ImageField(upload_to='product_images/', null=True, blank=True)
+    image = models.ImageField(upload_to='product_images/', storage=media_storage, null=True, blank=True)
     slug = models.SlugField(unique=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
+    # Units of stock held by unexpired StockReservations (see app.reservations).
+    reserved = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     approval_status = models.CharField(max_length=20, choices=APPROVAL_STATUS, default='pending')
     approval_note = models.TextField(blank=True, null=True)
     featured = models.BooleanField(default=False)
+    # Denormalized review summary, kept current by the Review signal handlers
+    # and rebuilt with `manage.py rebuild_rating_summaries`.
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count_1 = models.PositiveIntegerField(default=0)
+    rating_count_2 = models.PositiveIntegerField(default=0)
+    rating_count_3 = models.PositiveIntegerField(default=0)
+    rating_count_4 = models.PositiveIntegerField(default=0)
+    rating_count_5 = models.PositiveIntegerField(default=0)
+    # content_digest() of CONTENT_FIELDS as stored; empty when unknown (rows
+    # changed through queryset.update()), see app.bulk.ProductSync.
+    content_hash = models.CharField(max_length=40, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    CONTENT_FIELDS = ('name', 'description', 'price', 'stock', 'category', 'is_active')
+
+    @property
+    def available(self):
+        return self.stock - self.reserved
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_count_{star}') for star in RATING_STARS}
 
     def __str__(self):
         return self.name
 
+    def compute_content_hash(self):
+        return content_digest(self, self.CONTENT_FIELDS)
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.content_hash = self.compute_content_hash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.CONTENT_FIELDS):
+            kwargs['update_fields'] = [*update_fields, 'content_hash']
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The rating summary is only written through adjust_rating() and
+            # the reserved count through app.reservations, so a plain save
+            # must not overwrite them with possibly stale values. Columns left
+            # out by only()/defer() are not written either.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in RATING_SUMMARY_FIELDS
+                and field.name != 'reserved'
+                and field.attname not in deferred
+            ]
         super().save(*args, **kwargs)
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='product_images/')
+    image = models.ImageField(upload_to='product_images/', storage=media_storage)
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -107,16 +234,80 @@ class ProductVariant(models.Model):
     value = models.CharField(max_length=100)  # e.g., "XL", "Red"
     price_adjustment = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     stock = models.IntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=40, blank=True, default='', editable=False)
+
+    CONTENT_FIELDS = ('name', 'value', 'price_adjustment', 'stock')
+
+    @property
+    def available(self):
+        return self.stock - self.reserved
+
+    def compute_content_hash(self):
+        return content_digest(self, self.CONTENT_FIELDS)
+
+    def save(self, *args, **kwargs):
+        self.content_hash = self.compute_content_hash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.CONTENT_FIELDS):
+            kwargs['update_fields'] = [*update_fields, 'content_hash']
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Reservations change the reserved count concurrently.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved'
+            ]
+        super().save(*args, **kwargs)
+
+def money_field():
+    return DecimalField(max_digits=12, decimal_places=2)
+
+def line_subtotal():
+    """(product price + variant adjustment) * quantity of a cart item, in SQL."""
+    unit_price = F('product__price') + Coalesce(F('variant__price_adjustment'), Value(Decimal('0.00')))
+    return ExpressionWrapper(unit_price * F('quantity'), output_field=money_field())
+
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """Prefetch the items with the columns serializers show, and let the
+        database compute each subtotal and the cart total."""
+        totals = (
+            CartItem.objects.filter(cart=OuterRef('pk')).order_by()
+            .values('cart').annotate(total=Sum(line_subtotal())).values('total')
+        )
+        items = (
+            CartItem.objects.with_subtotal()
+            .select_related('product', 'variant')
+            .only(
+                'id', 'cart_id', 'product_id', 'variant_id', 'quantity', 'created_at',
+                'product__name', 'variant__name', 'variant__value',
+            )
+            .order_by('created_at', 'pk')
+        )
+        return self.annotate(
+            items_total=Coalesce(
+                Subquery(totals, output_field=money_field()), Value(Decimal('0.00')),
+                output_field=money_field(),
+            )
+        ).prefetch_related(Prefetch('items', queryset=items))
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     @property
     def total_amount(self):
+        if 'items_total' in self.__dict__:
+            return self.items_total
         return sum(item.subtotal for item in self.items.all())
 
+class CartItemQuerySet(models.QuerySet):
+    def with_subtotal(self):
+        return self.annotate(line_subtotal=line_subtotal())
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -124,13 +315,47 @@ class CartItem(models.Model):
     quantity = models.IntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        # NULLs never conflict in a unique index, so lines without a variant
+        # need a constraint of their own.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'product', 'variant'], condition=models.Q(variant__isnull=False),
+                name='unique_cart_item_variant',
+            ),
+            models.UniqueConstraint(
+                fields=['cart', 'product'], condition=models.Q(variant__isnull=True),
+                name='unique_cart_item_product',
+            ),
+        ]
+
     @property
     def subtotal(self):
+        if 'line_subtotal' in self.__dict__:
+            return self.line_subtotal
         base_price = self.product.price
         if self.variant:
             base_price += self.variant.price_adjustment
         return base_price * self.quantity
 
+class StockReservation(models.Model):
+    """Units of a product (and variant) held for a cart until ``expires_at``;
+    counted in their ``reserved`` columns (see app.reservations)."""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations'
+    )
+    quantity = models.PositiveIntegerField()
+    # The sweeper scans this index for expired reservations.
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} until {self.expires_at}"
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -158,10 +383,15 @@ class OrderItem(models.Model):
     vendor_earning = models.DecimalField(max_digits=10, decimal_places=2)  # Amount after commission
     platform_fee = models.DecimalField(max_digits=10, decimal_places=2)  # Commission amount
 
+    @staticmethod
+    def split(price, commission_rate):
+        """``(platform_fee, vendor_earning)`` of ``price`` at ``commission_rate`` percent."""
+        platform_fee = (price * Decimal(commission_rate) / 100).quantize(Decimal('0.01'))
+        return platform_fee, price - platform_fee
+
     def save(self, *args, **kwargs):
         if not self.pk:  # Only calculate on creation
-            self.platform_fee = self.price * Decimal(self.product.vendor.commission_rate / 100)
-            self.vendor_earning = self.price - self.platform_fee
+            self.platform_fee, self.vendor_earning = self.split(self.price, self.product.vendor.commission_rate)
         super().save(*args, **kwargs)
 
 class Transaction(models.Model):
@@ -215,6 +445,17 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the product's rating summary currently counts for this
+        # review so the signal handlers can undo it on update or delete.
+        instance._counted_rating = (
+            instance.__dict__.get('product_id'),
+            instance.__dict__.get('rating'),
+        )
+        return instance
+
 class Wishlist(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -255,7 +496,7 @@ class Testimonial(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     role = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='testimonial_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='testimonial_images/', storage=media_storage, blank=True, null=True)
     content = models.TextField()
     rating = models.IntegerField(default=5)
     is_active = models.BooleanField(default=True)
@@ -267,3 +508,190 @@ class Testimonial(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+class MediaBlobManager(models.Manager):
+    def adjust(self, name, delta):
+        """Add ``delta`` references to a blob (other names are ignored)."""
+        if is_blob(name):
+            self.filter(name=name).update(ref_count=F('ref_count') + delta)
+
+    def recount(self):
+        """Recompute every reference count from the image fields."""
+        counts = {}
+        for model, field in IMAGE_FIELDS.items():
+            rows = (
+                model.objects.filter(**{f'{field}__startswith': f'{MEDIA_BLOB_PREFIX}/'})
+                .values(field).annotate(references=Count('pk'))
+                .values_list(field, 'references').order_by()
+            )
+            for name, references in rows:
+                counts[name] = counts.get(name, 0) + references
+        known = set(self.values_list('name', flat=True))
+        self.bulk_create([self.model(name=name) for name in counts.keys() - known])
+        changed = []
+        for blob in self.only('pk', 'name', 'ref_count').iterator():
+            if blob.ref_count != counts.get(blob.name, 0):
+                blob.ref_count = counts.get(blob.name, 0)
+                changed.append(blob)
+        self.bulk_update(changed, ['ref_count'], batch_size=1000)
+        return len(changed)
+
+class MediaBlob(models.Model):
+    """A content-addressed media file (see app.storage) and how many model
+    rows currently reference it."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_uploaded_at = models.DateTimeField(default=timezone.now)
+
+    objects = MediaBlobManager()
+
+    def __str__(self):
+        return self.name
+
+class ImageDerivatives(models.Model):
+    """Widths of the resized/WebP derivatives written for a stored image (see
+    app.images), so ``srcset`` only lists files that exist."""
+    name = models.CharField(max_length=255, unique=True)
+    widths = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+class CoPurchaseManager(models.Manager):
+    def add_counts(self, counts, batch_size=1000):
+        """Add ``{(a, b): orders}`` pair counts, in both directions.
+
+        Returns the ids of the products whose neighbours changed.
+        """
+        deltas = {}
+        for (a, b), orders in counts.items():
+            deltas[a, b] = deltas[b, a] = orders
+        touched = sorted({product_id for product_id, _ in deltas})
+
+        changed = []
+        for start in range(0, len(touched), batch_size):
+            rows = self.filter(product_id__in=touched[start:start + batch_size]).only(
+                'pk', 'product_id', 'related_id', 'count'
+            )
+            for row in rows.iterator(chunk_size=batch_size):
+                orders = deltas.pop((row.product_id, row.related_id), None)
+                if orders:
+                    row.count += orders
+                    changed.append(row)
+        self.bulk_update(changed, ['count'], batch_size=batch_size)
+        self.bulk_create(
+            [self.model(product_id=a, related_id=b, count=orders) for (a, b), orders in deltas.items()],
+            batch_size=batch_size,
+        )
+        return touched
+
+    def rerank(self, product_ids, top_k, batch_size=1000):
+        """Rank the ``top_k`` neighbours of each product by count, unrank the rest."""
+        product_ids = sorted(product_ids)
+        for start in range(0, len(product_ids), batch_size):
+            rows = self.filter(product_id__in=product_ids[start:start + batch_size]).order_by(
+                'product_id', '-count', 'related_id'
+            ).only('pk', 'product_id', 'rank')
+            changed, current, position = [], None, 0
+            for row in rows.iterator(chunk_size=batch_size):
+                if row.product_id != current:
+                    current, position = row.product_id, 0
+                position += 1
+                rank = position if position <= top_k else None
+                if row.rank != rank:
+                    row.rank = rank
+                    changed.append(row)
+            self.bulk_update(changed, ['rank'], batch_size=batch_size)
+
+class CoPurchase(models.Model):
+    """How many orders contained both ``product`` and ``related``.
+
+    Every pair is stored in both directions; ``rank`` (1 = strongest) is set
+    on each product's top neighbours only. Maintained by
+    ``manage.py build_recommendations``.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchases')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_in')
+    count = models.PositiveIntegerField(default=0)
+    rank = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    objects = CoPurchaseManager()
+
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [
+            # Serves a product's ranked neighbours from one index range.
+            models.Index(fields=['product', 'rank'], name='app_copurchase_rank_idx'),
+        ]
+
+class JobCheckpoint(models.Model):
+    """How far an incremental background job has got (e.g. the last order id
+    it processed)."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+class ProductTerm(models.Model):
+    """One hashed term of a product's text, with its sublinear term
+    frequency (see app.similarity)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='terms')
+    bucket = models.PositiveIntegerField()
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('product', 'bucket')
+        indexes = [
+            # The inverted index: every product containing a term.
+            models.Index(fields=['bucket', 'product'], name='app_productterm_bucket_idx'),
+        ]
+
+class SimilarProduct(models.Model):
+    """One of a product's most similar products by text (rank 1 = most
+    similar), precomputed by ``manage.py build_similarity_index``."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='similar_entries')
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        # Also serves a product's ranked list from one index range.
+        unique_together = ('product', 'rank')
+
+class SimilarityDocument(models.Model):
+    """Signature of the text and listing a product's ``ProductTerm`` rows were
+    built from, so rebuilds only re-index and re-rank around products that
+    changed."""
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='similarity_document'
+    )
+    signature = models.CharField(max_length=40)
+
+class IdempotencyKey(models.Model):
+    """The first response to a POST sent with an ``Idempotency-Key`` header,
+    replayed for its retries (see app.idempotency)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    # Hash of the method, path and body the key was first used with.
+    fingerprint = models.CharField(max_length=64)
+    # Null while the first request is still running.
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+# Image fields stored through app.storage, by model.
+IMAGE_FIELDS = {
+    Product: 'image',
+    ProductImage: 'image',
+    Category: 'image',
+    Testimonial: 'image',
+    User: 'profile_image',
+}
@@ -0,0 +1,108 @@
+"""Top-K nearest neighbours of sparse tf-idf vectors, for app.similarity.
+
+A vector is a ``{bucket: weight}`` dict, L2-normalized, so the dot product
+of two vectors is their cosine similarity. Scoring a product walks the
+posting lists of its ``MAX_QUERY_TERMS`` heaviest terms. Each posting list
+keeps only the ``MAX_POSTINGS`` candidates in which the term weighs most.
+So the work per product is bounded whatever the catalog size: a term shared
+by half the catalog costs no more than a rare one. It also bounds what a
+change can reach: ``affected`` lists the products whose ranking a changed
+product can enter, so the others need not be re-ranked.
+
+Like app.recommendations, this module imports nothing from Django, so large
+builds can be split across worker processes.
+"""
+import heapq
+import math
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from operator import itemgetter
+
+from .recommendations import chunked
+
+MAX_POSTINGS = 100
+MAX_QUERY_TERMS = 16
+
+_vectors = _postings = None
+
+
+def idf(total, frequency):
+    """Smoothed inverse document frequency of a term in ``frequency`` of
+    ``total`` documents; never zero, so small catalogs still match."""
+    return math.log((1 + total) / (1 + frequency)) + 1
+
+
+def tfidf(terms, idfs):
+    """L2-normalized tf-idf vector of ``{bucket: tf}``."""
+    weights = {key: tf * idfs[key] for key, tf in terms.items()}
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    return {key: weight / norm for key, weight in weights.items()} if norm else {}
+
+
+def posting_lists(vectors, candidates, limit=MAX_POSTINGS):
+    """``{bucket: [(weight, id), ...]}`` over the ``candidates`` ids, keeping
+    the ``limit`` heaviest entries of each bucket."""
+    postings = defaultdict(list)
+    for pk in candidates:
+        for key, weight in vectors[pk].items():
+            postings[key].append((weight, pk))
+    return {
+        key: entries if len(entries) <= limit else heapq.nlargest(limit, entries)
+        for key, entries in postings.items()
+    }
+
+
+def query_terms(vector):
+    """The ``(bucket, weight)`` terms whose posting lists score ``vector``."""
+    return heapq.nlargest(MAX_QUERY_TERMS, vector.items(), key=itemgetter(1))
+
+
+def affected(vectors, postings, changed):
+    """Ids of ``changed`` and of every product querying a posting list that
+    holds one of them: the products whose neighbours ``changed`` can enter."""
+    buckets = {
+        key
+        for pk in changed if pk in vectors
+        for key in vectors[pk]
+        if any(other == pk for weight, other in postings.get(key, ()))
+    }
+    return set(changed) | {
+        pk for pk, vector in vectors.items()
+        if any(key in buckets for key, weight in query_terms(vector))
+    }
+
+
+def neighbours(product_ids, top_k, vectors=None, postings=None):
+    """``{id: [(score, neighbour id), ...]}``, best first, for ``product_ids``."""
+    vectors = _vectors if vectors is None else vectors
+    postings = _postings if postings is None else postings
+    result = {}
+    for pk in product_ids:
+        scores = defaultdict(float)
+        for key, weight in query_terms(vectors[pk]):
+            for other_weight, other in postings.get(key, ()):
+                scores[other] += weight * other_weight
+        scores.pop(pk, None)
+        result[pk] = [
+            (score, other) for other, score in heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
+        ]
+    return result
+
+
+def _init_worker(vectors, postings):
+    global _vectors, _postings
+    _vectors, _postings = vectors, postings
+
+
+def compute_neighbours(vectors, postings, product_ids, top_k, workers=1, chunk_size=2000):
+    """``neighbours`` of ``product_ids``, split across ``workers`` processes."""
+    if workers <= 1:
+        return neighbours(product_ids, top_k, vectors, postings)
+    result = {}
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(vectors, postings)
+    ) as executor:
+        for part in executor.map(neighbours, chunked(product_ids, chunk_size), repeat(top_k)):
+            result.update(part)
+    return result
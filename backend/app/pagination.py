@@ -0,0 +1,122 @@
+import binascii
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds, which would break the
+        # equality half of the keyset comparison.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset pagination over the queryset's own ordering.
+
+    The ordering set by the view (or an OrderingFilter) is extended with the
+    primary key as a tie-breaker, e.g. ``(-created_at, -id)`` or
+    ``(price, id)``, and each page is fetched with a ``WHERE (key) > cursor``
+    condition instead of an OFFSET, so deep pages cost the same as the first.
+    Cursors are opaque base64 tokens holding the boundary row's key values.
+    Ordering fields must be non-nullable.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    default_ordering = ('-created_at',)
+
+    def get_keyset(self, queryset):
+        ordering = list(queryset.query.order_by)
+        if not ordering and queryset.query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        if not ordering:
+            field_names = {field.name for field in queryset.model._meta.concrete_fields}
+            ordering = [field for field in self.default_ordering if field.lstrip('-') in field_names]
+        if not all(isinstance(field, str) for field in ordering):
+            raise TypeError('KeysetPagination only supports orderings by field name.')
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def keyset_filter(self, ordering, values):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), per-field direction.
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.keyset = self.get_keyset(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+
+        ordering = [_flip(field) for field in self.keyset] if reverse else self.keyset
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(ordering, cursor['values']))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        payload = {
+            'o': self.keyset,
+            'v': [getattr(instance, field.lstrip('-')) for field in self.keyset],
+            'r': reverse,
+        }
+        data = json.dumps(payload, cls=CursorEncoder, separators=(',', ':'))
+        token = urlsafe_b64encode(data.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            if payload['o'] != self.keyset or len(payload['v']) != len(self.keyset):
+                raise ValueError
+            if any(value is None for value in payload['v']):
+                raise ValueError
+            return {'values': payload['v'], 'reverse': bool(payload['r'])}
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,50 @@
+"""Admin approval of payments.
+
+Approving a transaction credits every vendor in its order with a
+``VendorEarning`` per order item. ``approve_transactions`` approves any
+number of transactions in one database transaction, with a fixed number of
+queries:
+
+- one query to lock the transactions;
+- one ``UPDATE`` that marks them approved;
+- one query that reads their order items without earnings, with each
+  product's vendor;
+- one ``bulk_create`` for the earnings.
+
+Items that already have an earning (approved before, or approved twice) are
+skipped, so approving is safe to repeat.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OrderItem, Transaction, VendorEarning
+
+
+def approve_transactions(transaction_ids, note=''):
+    """Approve the payments ``transaction_ids``; returns ``(approved ids,
+    number of vendor earnings created)``."""
+    with transaction.atomic():
+        # Locked, so concurrent approvals of the same transactions wait
+        # rather than both finding the items without earnings.
+        rows = list(
+            Transaction.objects.select_for_update().filter(pk__in=transaction_ids)
+            .order_by('pk').values_list('pk', 'order_id')
+        )
+        if not rows:
+            return [], 0
+        approved = [pk for pk, _ in rows]
+        Transaction.objects.filter(pk__in=approved).update(
+            admin_approved=True, admin_note=note, updated_at=timezone.now()
+        )
+        items = OrderItem.objects.filter(
+            order_id__in={order_id for _, order_id in rows}, vendorearning__isnull=True
+        ).values_list('pk', 'product__vendor_id', 'vendor_earning')
+        earnings = VendorEarning.objects.bulk_create(
+            [
+                VendorEarning(vendor_id=vendor_id, order_item_id=pk, amount=amount)
+                for pk, vendor_id, amount in items
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+    return approved, len(earnings)
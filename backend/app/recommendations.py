@@ -0,0 +1,49 @@
+"""Co-purchase ("frequently bought together") counting.
+
+A basket is the set of product ids in one order. Every unordered pair of
+products in a basket counts once, which gives a sparse, symmetric
+co-occurrence matrix stored row by row in ``CoPurchase``; each product's
+``TOP_K`` strongest neighbours are ranked there for the ``related`` action.
+
+Counting is CPU-bound, so large runs are split into chunks of baskets counted
+in worker processes and merged. This module deliberately imports nothing from
+Django so the workers can load it under any multiprocessing start method.
+``manage.py build_recommendations`` does the database side.
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, islice
+
+CHECKPOINT = 'recommendations'
+RELATED_PRODUCTS = 'related-products'
+TOP_K = 20
+
+# Pairs grow quadratically with basket size, and very large (wholesale)
+# orders say little about what is bought together.
+MAX_BASKET_SIZE = 50
+
+
+def pair_counts(baskets):
+    """Count product pairs, as ``(lower id, higher id)``, over ``baskets``."""
+    counts = Counter()
+    for basket in baskets:
+        if 1 < len(basket) <= MAX_BASKET_SIZE:
+            counts.update(combinations(sorted(basket), 2))
+    return counts
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def count_pairs(baskets, workers=1, chunk_size=5000):
+    """``pair_counts`` over ``baskets``, split across ``workers`` processes."""
+    if workers <= 1:
+        return pair_counts(baskets)
+    total = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for counts in executor.map(pair_counts, chunked(baskets, chunk_size)):
+            total.update(counts)
+    return total
@@ -0,0 +1,136 @@
+"""Time-boxed stock reservations.
+
+``reserve_cart`` holds a cart's quantities for ``settings.STOCK_RESERVATION_TTL``
+seconds, for instance while the buyer is on the payment page. A reservation
+raises the ``reserved`` count of its product (and variant) with a conditional
+``UPDATE ... WHERE stock >= reserved + n``, so ``stock - reserved`` (the
+``available`` property) never goes negative and is read from the row itself,
+with no join. ``StockReservation`` rows record what to give back.
+
+Checkout releases the cart's reservations and takes the stock in the same
+transaction (see app.checkout). Reservations that are never checked out
+expire: ``manage.py release_expired_reservations`` walks the ``expires_at``
+index and gives their units back in batches.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from . import caching
+from .models import Cart, CartItem, Product, ProductVariant, StockReservation
+
+
+class OutOfStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Some items are no longer available in the requested quantity.'
+    default_code = 'out_of_stock'
+
+
+def line_quantities(lines):
+    """``({product id: n}, {variant id: n})`` of ``(product, variant, quantity)`` lines."""
+    products, variants = Counter(), Counter()
+    for product_id, variant_id, quantity in lines:
+        products[product_id] += quantity
+        if variant_id is not None:
+            variants[variant_id] += quantity
+    return products, variants
+
+
+def _touch(model):
+    return {'updated_at': timezone.now()} if model is Product else {}
+
+
+def _invalidate(product_ids):
+    if product_ids:
+        transaction.on_commit(lambda: caching.invalidate(*(f'product:{pk}' for pk in product_ids)))
+
+
+def _hold(model, quantities):
+    """Reserve ``quantities`` ({pk: n}) of ``model``; returns the pks short of stock."""
+    short = []
+    # In id order, so concurrent reservations lock rows in the same order.
+    for pk, quantity in sorted(quantities.items()):
+        updated = model.objects.filter(pk=pk, stock__gte=F('reserved') + quantity).update(
+            reserved=F('reserved') + quantity, **_touch(model)
+        )
+        if not updated:
+            short.append(pk)
+    return short
+
+
+def _unhold(model, quantities):
+    if quantities:
+        model.objects.filter(pk__in=quantities).update(reserved=F('reserved') - Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=IntegerField(),
+        ), **_touch(model))
+
+
+def release(reservations):
+    """Give back the units held by the ``reservations`` queryset and delete
+    them; returns how many were released."""
+    with transaction.atomic():
+        rows = list(reservations.select_for_update().values_list('pk', 'product_id', 'variant_id', 'quantity'))
+        if not rows:
+            return 0
+        StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        products, variants = line_quantities(row[1:] for row in rows)
+        _unhold(Product, products)
+        _unhold(ProductVariant, variants)
+        _invalidate(list(products))
+    return len(rows)
+
+
+def reserve_cart(cart):
+    """Hold the stock for everything in ``cart``, replacing its earlier
+    reservations; returns the expiry time. Raises ``OutOfStock`` and holds
+    nothing if any line is short."""
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    with transaction.atomic():
+        Cart.objects.select_for_update().get(pk=cart.pk)
+        release(StockReservation.objects.filter(cart=cart))
+        lines = list(CartItem.objects.filter(cart=cart).values_list('product_id', 'variant_id', 'quantity'))
+        if not lines:
+            raise ValidationError({'cart': 'The cart is empty.'})
+
+        products, variants = line_quantities(lines)
+        short_products = _hold(Product, products)
+        short_variants = _hold(ProductVariant, variants)
+        if short_products or short_variants:
+            raise OutOfStock({
+                'detail': OutOfStock.default_detail,
+                'products': short_products,
+                'variants': short_variants,
+            })
+        StockReservation.objects.bulk_create([
+            StockReservation(
+                cart=cart, product_id=product_id, variant_id=variant_id,
+                quantity=quantity, expires_at=expires_at,
+            )
+            for product_id, variant_id, quantity in lines
+        ])
+        _invalidate(list(products))
+    return expires_at
+
+
+def release_expired(batch_size=500):
+    """Release every reservation past its expiry, ``batch_size`` per
+    transaction; returns how many were released."""
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=timezone.now())
+            .order_by('expires_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        # A reservation checked out meanwhile is already gone and skipped.
+        released += release(StockReservation.objects.filter(pk__in=ids))
+        if len(ids) < batch_size:
+            return released
@@ -0,0 +1,174 @@
+"""Full-text product search.
+
+Products are indexed on name and description. The backend is chosen from
+``settings.PRODUCT_SEARCH_BACKEND`` (a dotted path) or, by default, from the
+database vendor: an FTS5 virtual table kept in sync by triggers on SQLite, a
+GIN-indexed tsvector expression on PostgreSQL, and plain ``icontains``
+matching everywhere else.
+
+Every backend returns the filtered queryset annotated with ``search_rank``
+(higher is more relevant), so filtering and ordering can still be applied
+afterwards.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .models import Product
+
+TERM_RE = re.compile(r'\w+')
+
+
+def search_terms(query):
+    return TERM_RE.findall(query or '')
+
+
+class BaseSearchBackend:
+    def install(self, connection):
+        """Create whatever index structures the backend needs (idempotent)."""
+
+    def rebuild(self, connection):
+        """Re-index every product from scratch."""
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    def search(self, queryset, query):
+        condition = Q()
+        for term in search_terms(query):
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    table = 'app_product_fts'
+    # BM25 column weights: matches in the name count more than in the description.
+    weights = (10.0, 1.0)
+
+    def install(self, connection):
+        product_table = Product._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [self.table],
+            )
+            created = cursor.fetchone() is None
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                f"USING fts5(name, description, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            # Table rebuilds during later migrations drop these triggers, so
+            # they are re-created after every migrate.
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_ai AFTER INSERT ON {product_table} BEGIN "
+                f"INSERT INTO {self.table}(rowid, name, description) "
+                f"VALUES (new.id, new.name, new.description); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_ad AFTER DELETE ON {product_table} BEGIN "
+                f"DELETE FROM {self.table} WHERE rowid = old.id; END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_au "
+                f"AFTER UPDATE OF name, description ON {product_table} BEGIN "
+                f"UPDATE {self.table} SET name = new.name, description = new.description "
+                f"WHERE rowid = old.id; END"
+            )
+        if created:
+            self.rebuild(connection)
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table}"
+            )
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')")
+
+    def match_expression(self, terms):
+        # Quote every term so user input can never be parsed as FTS5 syntax;
+        # the trailing * makes the last term a prefix match for as-you-type search.
+        quoted = ['"%s"' % term.replace('"', '""') for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, queryset, query):
+        match = self.match_expression(search_terms(query))
+        product_table = Product._meta.db_table
+        matches = RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s",
+            (match,),
+        )
+        rank = RawSQL(
+            f"SELECT -bm25({self.table}, %s, %s) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND rowid = \"{product_table}\".\"id\"",
+            (*self.weights, match),
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    config = 'english'
+    index_name = 'app_product_search_idx'
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.index_name} ON {Product._meta.db_table} "
+                f"USING GIN (("
+                f"setweight(to_tsvector('{self.config}'::regconfig, COALESCE(name, '')), 'A') || "
+                f"setweight(to_tsvector('{self.config}'::regconfig, COALESCE(description, '')), 'B')"
+                f"))"
+            )
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = (
+            SearchVector('name', weight='A', config=self.config)
+            + SearchVector('description', weight='B', config=self.config)
+        )
+        search_query = SearchQuery(query, search_type='websearch', config=self.config)
+        return queryset.alias(search_vector=vector).filter(
+            search_vector=search_query
+        ).annotate(search_rank=SearchRank(vector, search_query))
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using=None):
+    using = using or connection
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(using.vendor, SimpleSearchBackend)()
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """``?search=`` filter backed by the configured full-text search backend.
+
+    Results come back ordered by relevance; an explicit ``?ordering=`` applied
+    by a later OrderingFilter takes precedence.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not search_terms(query):
+            return queryset
+        queryset = get_search_backend().search(queryset, query)
+        return queryset.order_by('-search_rank', '-pk')
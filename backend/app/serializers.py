@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
 from django.db import IntegrityError
+from .carts import MAX_QUANTITY
+from .images import srcset as image_srcset
 from .models import (
     Category, Product, ProductImage, ProductVariant,
     Cart, CartItem, Order, OrderItem, Transaction,
@@ -11,6 +14,12 @@ from .models import (
 
 User = get_user_model()
 
+class SrcsetField(serializers.ReadOnlyField):
+    """``srcset`` URLs of the resized/WebP derivatives of an image field."""
+
+    def to_representation(self, value):
+        return image_srcset(value.name if value else None, self.context.get('request'))
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
     confirm_password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
@@ -19,13 +28,14 @@ class UserSerializer(serializers.ModelSerializer):
     user_type = serializers.CharField(required=True)
     store_name = serializers.CharField(required=False, allow_blank=True)
     store_description = serializers.CharField(required=False, allow_blank=True)
+    profile_image_srcset = SrcsetField(source='profile_image')
 
     class Meta:
         model = User
         fields = (
             'id', 'username', 'email', 'password', 'confirm_password',
             'phone_number', 'address', 'user_type', 'store_name','full_name',
-            'store_description', 'profile_image', 'is_verified',
+            'store_description', 'profile_image', 'profile_image_srcset', 'is_verified',
             'date_joined'
         )
         
@@ -111,47 +121,139 @@ class LoginSerializer(serializers.Serializer):
     
 class CategorySerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
+    product_count = serializers.SerializerMethodField()
+    image_srcset = SrcsetField(source='image')
 
     class Meta:
         model = Category
-        fields = ('id', 'name', 'slug', 'parent', 'description', 'image', 'children')
+        fields = (
+            'id', 'name', 'slug', 'parent', 'description', 'image', 'image_srcset',
+            'product_count', 'children'
+        )
+
+    def get_product_count(self, obj):
+        # Only present on querysets built with Category.objects.with_product_counts().
+        return getattr(obj, 'product_count', None)
 
     def get_children(self, obj):
-        return CategorySerializer(obj.get_children(), many=True).data
+        # Nodes loaded through get_cached_trees() answer get_children() from
+        # memory, so a whole tree serializes without further queries.
+        return CategorySerializer(obj.get_children(), many=True, context=self.context).data
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = SrcsetField(source='image')
+
     class Meta:
         model = ProductImage
-        fields = ('id', 'image', 'is_primary')
+        fields = ('id', 'image', 'srcset', 'is_primary')
 
 class ProductVariantSerializer(serializers.ModelSerializer):
+    available = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = ProductVariant
-        fields = ('id', 'name', 'value', 'price_adjustment', 'stock')
+        fields = ('id', 'name', 'value', 'price_adjustment', 'stock', 'available')
+
+class DynamicFieldsMixin:
+    """Accept ``fields`` / ``omit`` keyword arguments that narrow the
+    serializer down to a subset of its declared fields."""
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or ():
+            self.fields.pop(name, None)
+
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # Model columns (and related paths) each output field reads, used by the
+    # views to load only what the requested fields need.
+    field_sources = {
+        'category_name': ('category__name',),
+        'vendor_name': ('vendor__username',),
+        'images': (),
+        'variants': (),
+        'thumbnail': ('image',),
+        'thumbnail_srcset': ('image',),
+        'available': ('stock', 'reserved'),
+        'average_rating': ('rating_count', 'rating_sum'),
+        'review_count': ('rating_count',),
+        'rating_histogram': tuple(f'rating_count_{star}' for star in (1, 2, 3, 4, 5)),
+    }
 
-class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     variants = ProductVariantSerializer(many=True, read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     vendor_name = serializers.CharField(source='vendor.username', read_only=True)
     average_rating = serializers.SerializerMethodField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+    # Stock not held by checkout reservations (see app.reservations).
+    available = serializers.IntegerField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = (
             'id', 'name', 'slug', 'description', 'price',
-            'stock', 'category', 'category_name', 'vendor',
-            'vendor_name', 'images', 'variants', 'is_active',
+            'stock', 'available', 'category', 'category_name', 'vendor',
+            'vendor_name', 'images', 'variants', 'thumbnail', 'thumbnail_srcset', 'is_active',
             'approval_status', 'approval_note', 'featured',
-            'average_rating', 'created_at'
+            'average_rating', 'review_count', 'rating_histogram', 'created_at'
         )
         read_only_fields = ('slug', 'vendor', 'approval_status', 'approval_note')
 
     def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if not reviews:
+        if not obj.rating_count:
             return None
-        return sum(review.rating for review in reviews) / len(reviews)
+        return obj.rating_sum / obj.rating_count
+
+    def thumbnail_name(self, obj):
+        # The product's own image, else the gallery image annotated by
+        # Product.objects.with_thumbnail() (or found in prefetched images).
+        if obj.image:
+            return obj.image.name
+        if hasattr(obj, 'primary_image'):
+            return obj.primary_image
+        gallery = sorted(
+            obj.images.all(),
+            key=lambda image: (not image.is_primary, image.created_at, image.pk),
+        )
+        return gallery[0].image.name if gallery else None
+
+    def get_thumbnail(self, obj):
+        name = self.thumbnail_name(obj)
+        if not name:
+            return None
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_thumbnail_srcset(self, obj):
+        return image_srcset(self.thumbnail_name(obj), self.context.get('request'))
+
+class ProductListSerializer(ProductSerializer):
+    """Slim product representation for listing pages and grids."""
+
+    class Meta(ProductSerializer.Meta):
+        fields = (
+            'id', 'name', 'slug', 'description', 'price', 'stock', 'available',
+            'category', 'vendor', 'thumbnail', 'thumbnail_srcset', 'featured',
+            'average_rating', 'review_count', 'created_at'
+        )
+
+class ProductImportSerializer(serializers.Serializer):
+    """One row of a bulk product import (see app.bulk)."""
+    slug = serializers.SlugField(max_length=50, required=False)
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    stock = serializers.IntegerField(min_value=0, default=0)
+    category = serializers.CharField()
+    is_active = serializers.BooleanField(default=True)
+    variants = ProductVariantSerializer(many=True, required=False)
 
 class CartItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -179,6 +281,24 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'items', 'total_amount', 'created_at')
         read_only_fields = ('user',)
 
+class CartLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    variant = serializers.IntegerField(required=False, allow_null=True, default=None)
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY, default=1)
+
+class CartLinesSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True, allow_empty=False, max_length=200)
+
+class CheckoutSerializer(serializers.Serializer):
+    shipping_address = serializers.CharField()
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+class PaymentApprovalSerializer(serializers.Serializer):
+    transactions = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=5000
+    )
+    note = serializers.CharField(required=False, allow_blank=True, default='')
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     variant_name = serializers.SerializerMethodField()
@@ -276,9 +396,11 @@ class WishlistSerializer(serializers.ModelSerializer):
         read_only_fields = ('user',)
 
 class TestimonialSerializer(serializers.ModelSerializer):
+    image_srcset = SrcsetField(source='image')
+
     class Meta:
         model = Testimonial
-        fields = ['id', 'name', 'role', 'image', 'content', 'rating', 'created_at']
+        fields = ['id', 'name', 'role', 'image', 'image_srcset', 'content', 'rating', 'created_at']
 
 class VendorAnalyticsSerializer(serializers.ModelSerializer):
     class Meta:
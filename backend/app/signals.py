@@ -0,0 +1,194 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from mptt.signals import node_moved
+
+from . import autocomplete, caching, reservations
+from .facets import PRODUCT_FACETS
+from .images import schedule_derivatives
+from .models import (
+    IMAGE_FIELDS, Cart, CartItem, Category, MediaBlob, Product, ProductImage,
+    ProductVariant, Review, Testimonial, User,
+)
+from .search import get_search_backend
+
+
+def _counted_rating(review):
+    return getattr(review, '_counted_rating', (review.product_id, review.rating))
+
+
+def _adjust_rating(product_id, rating, delta):
+    Product.objects.filter(pk=product_id).adjust_rating(rating, delta)
+    caching.invalidate(f'product:{product_id}')
+
+
+@receiver(post_save, sender=Review)
+def update_rating_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.product_id, instance.rating)
+    if not created:
+        previous = getattr(instance, '_counted_rating', None)
+        if previous is None or previous == current:
+            return
+        _adjust_rating(*previous, -1)
+    _adjust_rating(instance.product_id, instance.rating, 1)
+    instance._counted_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_summary_on_delete(sender, instance, **kwargs):
+    _adjust_rating(*_counted_rating(instance), -1)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using='default', **kwargs):
+    if sender.name != 'app':
+        return
+    connection = connections[using]
+    get_search_backend(connection).install(connection)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_category_tree(sender, **kwargs):
+    # The rendered tree carries per-category product counts, so product
+    # changes invalidate it as well.
+    caching.invalidate(caching.CATEGORY_TREE)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_facets(sender, **kwargs):
+    caching.invalidate(PRODUCT_FACETS)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_responses(sender, instance, **kwargs):
+    # The category tag covers the subtree product counts on category responses.
+    caching.invalidate(
+        'product-list',
+        f'product:{instance.pk}',
+        f'category:{instance.category_id}',
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def invalidate_category_responses(sender, instance, **kwargs):
+    caching.invalidate('category-list', f'category:{instance.pk}')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_autocomplete(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'name', 'is_active', 'approval_status'} & set(update_fields)):
+        return
+    autocomplete.schedule_refresh('product' if sender is Product else 'category', instance.pk)
+
+
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Testimonial)
+def invalidate_testimonial_responses(sender, instance, **kwargs):
+    caching.invalidate('testimonial-list', f'testimonial:{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_vendor_responses(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no cached response shows.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if instance.is_vendor:
+        caching.invalidate(f'vendor:{instance.pk}')
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, raw=False, **kwargs):
+    # Variants and images are part of the product representation, so they
+    # advance its updated_at (used for Last-Modified) and drop cached copies.
+    if raw:
+        return
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+    caching.invalidate(f'product:{instance.product_id}')
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def touch_cart(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Cart.objects.filter(pk=instance.cart_id).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Cart)
+@receiver(pre_delete, sender=ProductVariant)
+def release_reservations(sender, instance, **kwargs):
+    # Cascading deletes would drop the reservations without giving back the
+    # units they hold.
+    reservations.release(instance.reservations.all())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_save, sender=User)
+def generate_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The worker skips images whose derivatives are already recorded, so
+    # saves that did not change the image cost no more than a cache lookup.
+    field = IMAGE_FIELDS[sender]
+    if raw or (update_fields is not None and field not in update_fields):
+        return
+    schedule_derivatives(getattr(instance, field).name)
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductImage)
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=Testimonial)
+@receiver(post_init, sender=User)
+def remember_stored_image(sender, instance, **kwargs):
+    # Skipped for deferred fields, which would otherwise be loaded here.
+    field = IMAGE_FIELDS[sender]
+    if field in instance.__dict__:
+        instance._stored_image = getattr(instance, field).name or None
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_save, sender=User)
+def count_image_references(sender, instance, created, update_fields=None, **kwargs):
+    field = IMAGE_FIELDS[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    previous = None if created else getattr(instance, '_stored_image', None)
+    current = getattr(instance, field).name or None
+    if previous != current:
+        MediaBlob.objects.adjust(previous, -1)
+        MediaBlob.objects.adjust(current, 1)
+    instance._stored_image = current
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Testimonial)
+@receiver(post_delete, sender=User)
+def release_image_reference(sender, instance, **kwargs):
+    MediaBlob.objects.adjust(getattr(instance, '_stored_image', None), -1)
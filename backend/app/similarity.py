@@ -0,0 +1,166 @@
+"""Content-based "similar products".
+
+A product's name (counted twice), description and category path are
+tokenized and hashed into ``BUCKETS`` term buckets, so no vocabulary has to
+be kept and products can be re-indexed one at a time. ``ProductTerm`` stores
+each product's sublinear term frequencies.
+
+``build_neighbours`` turns those into L2-normalized tf-idf vectors, with
+document frequencies counted over the whole catalog in one query. It ranks
+each product's ``TOP_K`` most similar approved, active products (see
+app.neighbours) into ``SimilarProduct``. A request then reads a single index
+range and does no scoring.
+
+``manage.py build_similarity_index`` re-indexes the products whose name,
+description, category path or listing (active and approved) changed since
+they were last indexed. It then re-ranks only the products those changes can
+reach. Products it leaves alone keep scores from older document frequencies
+until a ``--full`` run re-ranks everything.
+"""
+import hashlib
+import math
+import zlib
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Category, Product, ProductTerm, SimilarProduct, SimilarityDocument
+from .neighbours import affected, compute_neighbours, idf, posting_lists, tfidf
+from .recommendations import chunked
+from .search import search_terms
+
+SIMILAR_PRODUCTS = 'similar-products'
+BUCKETS = 2 ** 20
+NAME_WEIGHT = 2
+TOP_K = 20
+# Product columns ``index_products`` and ``document_signature`` read.
+INDEX_FIELDS = ('pk', 'name', 'description', 'category_id', 'is_active', 'approval_status')
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from in into is it its of on or the this to with'.split()
+)
+
+
+def tokens(text):
+    return [
+        term for term in (term.lower() for term in search_terms(text))
+        if len(term) > 1 and term not in STOP_WORDS
+    ]
+
+
+def bucket(term):
+    return zlib.crc32(term.encode()) % BUCKETS
+
+
+def category_paths():
+    """``{category id: 'Root Sub Leaf'}`` for the whole tree, from one query."""
+    paths = {}
+    # Tree order lists every parent before its children.
+    for pk, name, parent_id in Category.objects.order_by('tree_id', 'lft').values_list('pk', 'name', 'parent_id'):
+        paths[pk] = f'{paths[parent_id]} {name}' if parent_id else name
+    return paths
+
+
+def signature(name, description, path, listed):
+    text = '\0'.join((name, description or '', path, '1' if listed else '0'))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def document_signature(row, paths):
+    """``signature`` of a row of ``INDEX_FIELDS``."""
+    pk, name, description, category_id, is_active, approval_status = row
+    listed = is_active and approval_status == 'approved'
+    return signature(name, description, paths.get(category_id, ''), listed)
+
+
+def term_weights(name, description, path):
+    counts = Counter()
+    for term in tokens(name):
+        counts[bucket(term)] += NAME_WEIGHT
+    for term in tokens(description) + tokens(path):
+        counts[bucket(term)] += 1
+    return {key: 1 + math.log(count) for key, count in counts.items()}
+
+
+def index_products(rows, paths, batch_size=1000):
+    """(Re-)index ``rows`` of ``INDEX_FIELDS`` in one transaction."""
+    ids, terms, documents = [], [], []
+    for row in rows:
+        pk, name, description, category_id = row[:4]
+        ids.append(pk)
+        terms.extend(
+            ProductTerm(product_id=pk, bucket=key, weight=weight)
+            for key, weight in term_weights(name, description, paths.get(category_id, '')).items()
+        )
+        documents.append(SimilarityDocument(product_id=pk, signature=document_signature(row, paths)))
+    with transaction.atomic():
+        ProductTerm.objects.filter(product_id__in=ids).delete()
+        ProductTerm.objects.bulk_create(terms, batch_size=batch_size)
+        SimilarityDocument.objects.bulk_create(
+            documents, batch_size=batch_size,
+            update_conflicts=True, unique_fields=['product'], update_fields=['signature'],
+        )
+
+
+def catalog_vectors():
+    """``{product id: tf-idf vector}`` of every indexed product."""
+    total = SimilarityDocument.objects.count()
+    idfs = {
+        key: idf(total, frequency)
+        for key, frequency in ProductTerm.objects.values('bucket').annotate(frequency=Count('pk'))
+        .values_list('bucket', 'frequency').order_by()
+    }
+    terms = defaultdict(dict)
+    rows = ProductTerm.objects.values_list('product_id', 'bucket', 'weight').order_by()
+    for pk, key, weight in rows.iterator(chunk_size=10000):
+        terms[pk][key] = weight
+    return {pk: tfidf(product_terms, idfs) for pk, product_terms in terms.items()}
+
+
+def previous_neighbours(product_ids, chunk_size=500):
+    """Ids of the products currently ranking one of ``product_ids``."""
+    found = set()
+    for chunk in chunked(product_ids, chunk_size):
+        found.update(SimilarProduct.objects.filter(similar_id__in=chunk).values_list('product_id', flat=True))
+    return found
+
+
+def build_neighbours(changed=None, top_k=TOP_K, workers=1, batch_size=1000):
+    """Re-rank the ``SimilarProduct`` rows of the products whose neighbours
+    the ``changed`` product ids can affect, or of every product when
+    ``changed`` is None; returns how many products were re-ranked.
+
+    Ranking runs outside any transaction; only swapping in the new rows
+    takes the write lock."""
+    vectors = catalog_vectors()
+    listed = Product.objects.filter(is_active=True, approval_status='approved').values_list('pk', flat=True)
+    postings = posting_lists(vectors, [pk for pk in listed.iterator() if pk in vectors])
+    if changed is None:
+        stale = set(vectors)
+    else:
+        stale = affected(vectors, postings, changed) | previous_neighbours(changed)
+    product_ids = sorted(pk for pk in stale if pk in vectors)
+    ranked = compute_neighbours(vectors, postings, product_ids, top_k, workers)
+    rows = [
+        SimilarProduct(product_id=pk, similar_id=other, score=score, rank=rank)
+        for pk, entries in ranked.items()
+        for rank, (score, other) in enumerate(entries, 1)
+    ]
+    with transaction.atomic():
+        if changed is None:
+            SimilarProduct.objects.all().delete()
+        else:
+            for chunk in chunked(stale, 500):
+                SimilarProduct.objects.filter(product_id__in=chunk).delete()
+        SimilarProduct.objects.bulk_create(rows, batch_size=batch_size)
+    return len(product_ids)
+
+
+def similar_products(product_id, limit=8):
+    """Ids of the approved, active products most similar to ``product_id``,
+    best first."""
+    return list(
+        SimilarProduct.objects.filter(
+            product_id=product_id, similar__is_active=True, similar__approval_status='approved'
+        ).order_by('rank').values_list('similar_id', flat=True)[:limit]
+    )
@@ -0,0 +1,126 @@
+"""Content-addressed storage for uploaded images.
+
+Uploads are streamed to a temporary file while being hashed and then moved
+to ``cas/<aa>/<bb>/<sha256>.<ext>``, so byte-identical uploads end up as one
+shared blob and a name never changes meaning, which lets those files be
+served with immutable cache headers.
+
+Each blob has a ``MediaBlob`` row counting the model rows that reference
+it (maintained by the signal handlers in app.signals). ``delete()`` only
+drops legacy, non-addressed files; unreferenced blobs are removed by
+``manage.py collect_media_garbage``.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from .images import derivatives_directory, forget_derivatives
+
+PREFIX = 'cas'
+EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+
+def blob_name(digest, extension):
+    return posixpath.join(PREFIX, digest[:2], digest[2:4], f'{digest}{extension}')
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{PREFIX}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        extension = posixpath.splitext(name)[1].lower()
+        if not EXTENSION_RE.match(extension):
+            extension = ''
+
+        # Uploads streamed by app.uploads arrive hashed, in a temporary file.
+        temporary_path = getattr(content, 'temporary_file_path', lambda: None)()
+        if getattr(content, 'sha256', None) and temporary_path and os.path.exists(temporary_path):
+            return self.adopt(temporary_path, content.sha256, extension, content.size)
+
+        staging = self.path(PREFIX)
+        os.makedirs(staging, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=staging, prefix='.upload-')
+        digest, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            name = blob_name(digest.hexdigest(), extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                # Identical content, so a concurrent writer of the same blob
+                # is harmless: the last atomic rename wins.
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        self.record(name, size)
+        return name
+
+    def adopt(self, path, digest, extension, size):
+        """Move an already hashed file (see app.uploads) into place."""
+        name = blob_name(digest, extension)
+        full_path = self.path(name)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                file_move_safe(path, full_path)
+            except FileExistsError:
+                pass  # stored concurrently, with the same content
+            else:
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        self.record(name, size)
+        return name
+
+    def record(self, name, size):
+        # Refreshing last_uploaded_at keeps a blob that is about to be
+        # referenced again out of the garbage collector's grace window.
+        MediaBlob = apps.get_model('app', 'MediaBlob')
+        MediaBlob.objects.update_or_create(
+            name=name, defaults={'size': size, 'last_uploaded_at': timezone.now()}
+        )
+
+    def delete(self, name):
+        if not is_blob(name):
+            super().delete(name)
+
+    def purge(self, name):
+        """Remove a blob and its derivatives from disk."""
+        super().delete(name)
+        shutil.rmtree(self.path(derivatives_directory(name)), ignore_errors=True)
+        forget_derivatives(name)
+
+
+_storage = None
+
+
+def media_storage():
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from app.bulk import SLUG_ATTEMPTS, ProductImporter
+from app.models import Category, Product, User
+
+
+class ImportSlugCollisionTests(TestCase):
+    """Another import taking slugs between the check and the insert."""
+
+    def setUp(self):
+        self.vendor = User.objects.create(username='vendor', email='vendor@example.com', user_type='vendor')
+        Category.objects.create(name='Shoes', slug='shoes')
+        self.rows = [
+            {'name': name, 'description': 'A shoe', 'price': '50', 'stock': '3', 'category': 'shoes'}
+            for name in ('Runner', 'Trail')
+        ]
+
+    def run_import(self, collides):
+        importer = ProductImporter(self.vendor)
+        write = importer.write
+        calls = []
+
+        def racing_write(products, variants):
+            calls.append([product.name for product in products])
+            if collides(products, len(calls)):
+                raise IntegrityError('UNIQUE constraint failed: app_product.slug')
+            return write(products, variants)
+
+        with mock.patch.object(importer, 'write', racing_write):
+            report = importer.run(iter(self.rows))
+        return report, calls
+
+    def test_retries_with_fresh_slugs(self):
+        report, calls = self.run_import(lambda products, call: call < SLUG_ATTEMPTS)
+
+        self.assertEqual(len(calls), SLUG_ATTEMPTS)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['errors'], [])
+
+    def test_rows_that_keep_colliding_are_reported(self):
+        report, calls = self.run_import(lambda products, call: any(p.name == 'Trail' for p in products))
+
+        self.assertEqual(len(calls), 2 * SLUG_ATTEMPTS + 1)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [2])
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Runner'])
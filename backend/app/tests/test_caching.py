@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from app.models import Category, Product, User
+
+
+class CachedConditionalGetTests(TestCase):
+    """ETags of cached catalog responses come from the response cache."""
+
+    def setUp(self):
+        cache.clear()
+        vendor = User.objects.create(username='vendor', email='vendor@example.com', user_type='vendor')
+        self.category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(
+            vendor=vendor, category=self.category, name='Runner', description='A shoe',
+            price=50, stock=3, approval_status='approved',
+        )
+        self.client = APIClient()
+
+    def assert_revalidates(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        return first['ETag']
+
+    def test_product_list_and_detail(self):
+        etag = self.assert_revalidates('/api/products/')
+        self.assert_revalidates(f'/api/products/{self.product.pk}/')
+
+        self.product.price = 40
+        self.product.save()
+        response = self.client.get('/api/products/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_categories(self):
+        etag = self.assert_revalidates('/api/categories/')
+        self.assert_revalidates(f'/api/categories/{self.category.slug}/')
+        self.assert_revalidates('/api/categories/tree/')
+
+        self.category.name = 'Sneakers'
+        self.category.save()
+        self.assertEqual(self.client.get('/api/categories/', headers={'If-None-Match': etag}).status_code, 200)
@@ -0,0 +1,38 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from app.carts import GUEST_CART_HEADER, GuestCart
+from app.models import User
+
+
+class LoginGuestCartTests(TestCase):
+    """A guest cart that cannot be merged never blocks a valid login."""
+
+    def setUp(self):
+        User.objects.create(username='buyer', email='buyer@example.com', password=make_password('secret'))
+        self.client = APIClient()
+
+    def login(self, **data):
+        return self.client.post(
+            '/api/auth/login/', {'email': 'buyer@example.com', 'password': 'secret', **data}, format='json'
+        )
+
+    def test_token_that_is_not_a_string_is_ignored(self):
+        self.assertIsNone(GuestCart(123).key)
+        response = self.login(guest_cart=123)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.data)
+
+    def test_merge_failure_still_logs_in(self):
+        with mock.patch('app.carts.merge_guest_cart', side_effect=RuntimeError('cache down')):
+            response = self.client.post(
+                '/api/auth/login/', {'email': 'buyer@example.com', 'password': 'secret'},
+                format='json', headers={GUEST_CART_HEADER: 'token'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.data)
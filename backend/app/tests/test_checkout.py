@@ -0,0 +1,65 @@
+import threading
+
+from django.db import connections
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from app.models import Cart, CartItem, Category, Order, Product, User
+
+
+class ParallelCheckoutTests(TransactionTestCase):
+    """Checkouts racing for the same stock on a file-backed database with the
+    shipped DATABASES options: every thread has its own connection, so the
+    conditional stock updates in app.checkout really run concurrently."""
+
+    buyers = 8
+    stock = 3
+
+    def setUp(self):
+        vendor = User.objects.create(username='vendor', email='vendor@example.com', user_type='vendor')
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(
+            vendor=vendor, category=category, name='Runner', description='A shoe',
+            price=50, stock=self.stock, approval_status='approved',
+        )
+        self.carts = []
+        for index in range(self.buyers):
+            buyer = User.objects.create(username=f'buyer{index}', email=f'buyer{index}@example.com')
+            cart = Cart.objects.create(user=buyer)
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            self.carts.append(cart)
+
+    def checkout_in_parallel(self):
+        barrier = threading.Barrier(len(self.carts))
+        statuses, errors = [], []
+
+        def checkout(cart):
+            client = APIClient()
+            client.force_authenticate(cart.user)
+            try:
+                barrier.wait()
+                response = client.post(f'/api/cart/{cart.pk}/checkout/', {'shipping_address': '1 Main St'})
+                statuses.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout, args=(cart,)) for cart in self.carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return statuses
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        statuses = self.checkout_in_parallel()
+
+        self.assertEqual(statuses.count(201), self.stock)
+        self.assertEqual(statuses.count(409), self.buyers - self.stock)
+        self.assertEqual(Order.objects.count(), self.stock)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        # Refused checkouts leave their carts untouched.
+        self.assertEqual(CartItem.objects.count(), self.buyers - self.stock)
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from app.idempotency import HEADER, REPLAYED_HEADER
+from app.models import Cart, Category, IdempotencyKey, Product, User
+
+
+class IdempotentAddItemTests(TestCase):
+
+    def setUp(self):
+        vendor = User.objects.create(username='vendor', email='vendor@example.com', user_type='vendor')
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(
+            vendor=vendor, category=category, name='Runner', description='A shoe',
+            price=50, stock=5, approval_status='approved',
+        )
+        self.buyer = User.objects.create(username='buyer', email='buyer@example.com')
+        self.cart = Cart.objects.create(user=self.buyer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def add_item(self, product_id, key='key-1'):
+        return self.client.post(
+            f'/api/cart/{self.cart.pk}/add_item/',
+            {'product': product_id, 'quantity': 1},
+            format='json',
+            headers={HEADER: key},
+        )
+
+    def test_success_is_replayed(self):
+        first = self.add_item(self.product.pk)
+        retry = self.add_item(self.product.pk)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(self.cart.items.get().quantity, 1)
+
+    def test_error_releases_the_key(self):
+        missing = self.add_item(self.product.pk + 1000)
+
+        self.assertEqual(missing.status_code, 404)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.add_item(self.product.pk + 1000).status_code, 404)
+
+    def test_abandoned_claim_is_taken_over(self):
+        record = IdempotencyKey.objects.create(user=self.buyer, key='key-1', fingerprint='')
+        lease = timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE + 1)
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - lease)
+
+        response = self.add_item(self.product.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self.assertEqual(self.cart.items.get().quantity, 1)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
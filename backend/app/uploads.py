@@ -0,0 +1,126 @@
+"""Streaming multipart upload handling.
+
+``StreamingUploadHandler`` replaces Django's default handlers, which buffer
+small files in memory. Every uploaded file is written chunk by chunk to a
+temporary file, and the same pass:
+
+- hashes it;
+- enforces the per-field size limit;
+- sniffs its type from the first bytes.
+
+An upload that breaks a limit stops the parse right there: an oversized
+request (by Content-Length) is refused before any of the body is read, and
+an oversized or disallowed file aborts as soon as the offending chunk
+arrives. The failure is recorded on the request and raised as a 413/415 API
+error by ``MultiPartParser``.
+
+Limits come from ``settings.UPLOAD_LIMITS`` keyed by form field name, with
+``'default'`` for any other field; ``types`` of None accepts any content.
+The finished ``TemporaryUploadedFile`` carries its ``sha256``, which
+``ContentAddressedStorage`` uses to store it without reading it again.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from rest_framework import parsers, status
+from rest_framework.exceptions import APIException
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Upload is too large.'
+    default_code = 'upload_too_large'
+
+
+class UnsupportedUploadType(APIException):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_detail = 'Unsupported file type.'
+    default_code = 'unsupported_upload_type'
+
+
+def sniff_type(head):
+    """Content type of a file from its first bytes, or None if unknown."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def upload_limits(field_name):
+    limits = settings.UPLOAD_LIMITS
+    return limits.get(field_name, limits['default'])
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    chunk_size = 64 * 2 ** 10
+
+    def reject(self, error, connection_reset=True):
+        self.request.upload_error = error
+        self.file.close()  # deletes the temporary file
+        raise StopUpload(connection_reset=connection_reset)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > settings.UPLOAD_MAX_REQUEST_BYTES:
+            self.request.upload_error = UploadTooLarge(
+                f'Request body exceeds {settings.UPLOAD_MAX_REQUEST_BYTES} bytes.'
+            )
+            # Returning a result tells Django the body is handled: none of
+            # it is read.
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        super().new_file(
+            field_name, file_name, content_type, content_length, charset, content_type_extra
+        )
+        self.limits = upload_limits(field_name)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.limits['max_bytes']:
+            self.reject(UploadTooLarge(
+                f"'{self.field_name}' exceeds {self.limits['max_bytes']} bytes."
+            ))
+        if start == 0 and self.limits['types'] is not None:
+            detected = sniff_type(raw_data[:16])
+            if detected not in self.limits['types']:
+                self.reject(UnsupportedUploadType(
+                    f"'{self.field_name}' must be one of: {', '.join(self.limits['types'])}."
+                ))
+            self.content_type = self.file.content_type = detected
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.sha256.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+class MultiPartParser(parsers.MultiPartParser):
+    """Raise the error recorded by ``StreamingUploadHandler``, if any."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        error = getattr(parser_context['request']._request, 'upload_error', None)
+        if error is not None:
+            raise error
+        return result
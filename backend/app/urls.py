@@ -40,6 +40,9 @@ router.register(r'buyer/cart', views.BuyerCartViewSet, basename='buyer-cart')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('autocomplete/', views.AutocompleteView.as_view(), name='autocomplete'),
+    path('guest-cart/', views.GuestCartView.as_view(), name='guest-cart'),
+    path('guest-cart/items/', views.GuestCartItemsView.as_view(), name='guest-cart-items'),
     # Authentication endpoints
     path('auth/register/', views.RegisterView.as_view(), name='register'),
     path('auth/login/', views.LoginView.as_view(), name='login'),
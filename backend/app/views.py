@@ -4,13 +4,32 @@ from rest_framework import viewsets, status, permissions, filters
 from rest_framework import serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from datetime import timedelta
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from mptt.utils import get_cached_trees
 from .serializers import UserSerializer, LoginSerializer  
+from . import autocomplete, bulk, carts, reservations, uploads
+from .checkout import place_order
+from .payments import approve_transactions
+from .search import FullTextSearchFilter
+from .filters import ProductFilter
+from .facets import PRODUCT_FACETS_TIMEOUT, compute_product_facets, facet_cache_key
+from .recommendations import RELATED_PRODUCTS
+from .similarity import SIMILAR_PRODUCTS, similar_products
+from . import caching
+from .caching import CachedReadMixin, cache_response, response_rows
+from .conditional import ConditionalGetMixin
+from .idempotency import IdempotentCreateMixin, idempotent
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from .storage import is_blob
 from django.contrib.auth import get_user_model
 from .models import (
     User, Category, Product, ProductImage, ProductVariant,
@@ -19,8 +38,9 @@ from .models import (
     AdministratorDashboardMetrics, Testimonial
 )
 from .serializers import (
-    UserSerializer, CategorySerializer, ProductSerializer,
-    CartSerializer, OrderSerializer, TransactionSerializer,
+    UserSerializer, CategorySerializer, ProductSerializer, ProductListSerializer,
+    CartSerializer, CartLineSerializer, CartLinesSerializer, CheckoutSerializer,
+    OrderSerializer, TransactionSerializer, PaymentApprovalSerializer,
     ReviewSerializer, WishlistSerializer, AdministratorDashboardMetricsSerializer,
     TestimonialSerializer
 )
@@ -52,10 +72,10 @@ class RegisterView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         try:
+            # A profile image was already streamed to disk by the upload
+            # handler and is stored by the serializer; its derivatives are
+            # generated by the image worker pool after commit.
             user = serializer.save()
-            # Handle profile image if needed
-            if 'profile_image' in self.request.FILES:
-                user.profile_image.save(...)
             # Set vendor verification status
             if user.user_type == 'vendor':
                 user.is_verified = False
@@ -97,6 +117,15 @@ class LoginView(generics.GenericAPIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
+            # Whatever the visitor put in their cart before logging in. A cart
+            # that cannot be merged never blocks the login itself.
+            try:
+                carts.merge_guest_cart(
+                    user, request.headers.get(carts.GUEST_CART_HEADER) or request.data.get('guest_cart')
+                )
+            except Exception as e:
+                logger.warning(f"Guest cart merge failed for user {user.pk}: {str(e)}", exc_info=True)
+
             refresh = RefreshToken.for_user(user)
             return Response({
                 'user': {
@@ -165,6 +194,16 @@ class AdministratorDashboardViewSet(viewsets.ViewSet):
         serializer = AdministratorDashboardMetricsSerializer(metrics)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Hit/miss counters of the public catalog response cache"""
+        if not request.user.is_administrator:
+            return Response(
+                {'error': 'Only administrators can view cache statistics'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(caching.response_cache_stats())
+
     @action(detail=False, methods=['get'])
     def pending_vendors(self, request):
         """Get list of pending vendor approvals"""
@@ -269,11 +308,58 @@ class VendorProductViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):  # handle schema generation
             return Product.objects.none()
-        return Product.objects.filter(vendor=self.request.user)
+        return (
+            Product.objects.filter(vendor=self.request.user)
+            .with_rating()
+            .select_related('category', 'vendor')
+            .prefetch_related('images', 'variants')
+        )
 
     def perform_create(self, serializer):
         serializer.save(vendor=self.request.user)
 
+    def run_upload(self, request, importer):
+        if not request.user.is_vendor:
+            return Response(
+                {'detail': 'Only vendors can import products'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            file_format = bulk.detect_format(upload.name, request.data.get('file_format'))
+        except bulk.ImportFormatError as e:
+            return Response({'file_format': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = importer.run(bulk.read_rows(upload, file_format))
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[uploads.MultiPartParser])
+    def bulk_import(self, request):
+        """Create products from an uploaded CSV or JSON Lines file"""
+        return self.run_upload(request, bulk.ProductImporter(request.user))
+
+    @action(detail=False, methods=['post'], parser_classes=[uploads.MultiPartParser])
+    def sync(self, request):
+        """Apply a full product feed, changing only the products that differ"""
+        deactivate = request.query_params.get('deactivate_missing', 'true').lower() not in ('0', 'false')
+        return self.run_upload(request, bulk.ProductSync(request.user, deactivate_missing=deactivate))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the vendor's products as CSV or JSON Lines"""
+        try:
+            file_format = bulk.detect_format('', request.query_params.get('file_format', 'csv'))
+        except bulk.ImportFormatError as e:
+            return Response({'file_format': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(
+            bulk.export_products(Product.objects.filter(vendor=request.user), file_format),
+            content_type=bulk.FORMATS[file_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
 class VendorOrderViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
@@ -316,12 +402,15 @@ class BuyerCartViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):  # handle schema generation
             return Cart.objects.none()
-        return Cart.objects.filter(user=self.request.user)
+        queryset = Cart.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_items()
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class TestimonialViewSet(viewsets.ModelViewSet):
+class TestimonialViewSet(CachedReadMixin, viewsets.ModelViewSet):
     queryset = Testimonial.objects.filter(is_active=True)
     serializer_class = TestimonialSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -331,14 +420,26 @@ class TestimonialViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsAdminUser()]
         return [permissions.AllowAny()]
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    def get_cache_tags(self, request, data):
+        tags = {'testimonial-list'} if self.action == 'list' else set()
+        tags.update(f"testimonial:{row['id']}" for row in response_rows(data))
+        return tags
+
+class ProductViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    """Products, with sparse fieldsets on reads.
+
+    ``list`` and ``featured`` return the slim ``ProductListSerializer`` by
+    default. ``?fields=a,b`` picks any of the full serializer's fields
+    instead and ``?omit=a,b`` drops fields from either; the queryset then only
+    joins, prefetches and loads the columns the chosen fields read.
+    """
+    queryset = Product.objects.with_rating()
     serializer_class = ProductSerializer
+    lookup_value_regex = r'\d+'
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'vendor', 'featured']
-    search_fields = ['name', 'description']
-    ordering_fields = ['created_at', 'price']
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
+    filterset_class = ProductFilter
+    ordering_fields = ['created_at', 'price', 'average_rating', 'review_count']
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -348,9 +449,93 @@ class ProductViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(vendor=self.request.user)
 
+    def is_sparse_read(self):
+        return self.request is not None and self.action in ('list', 'retrieve', 'featured', 'related', 'similar')
+
+    def get_fieldset(self):
+        """The ``fields`` / ``omit`` serializer arguments for this request."""
+        def split(param):
+            value = self.request.query_params.get(param)
+            if value is None:
+                return None
+            return [name.strip() for name in value.split(',') if name.strip()]
+
+        fields, omit = split('fields'), split('omit')
+        # Responses are tagged and cached by product id, so it is always kept.
+        if fields is not None:
+            fields.append('id')
+        if omit is not None:
+            omit = [name for name in omit if name != 'id']
+        return {'fields': fields, 'omit': omit}
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'featured', 'related', 'similar') and 'fields' not in self.request.query_params:
+            return ProductListSerializer
+        return ProductSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        if self.is_sparse_read():
+            kwargs.update(self.get_fieldset())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.is_sparse_read():
+            return queryset.select_related('category', 'vendor').prefetch_related('images', 'variants')
+
+        serializer_class = self.get_serializer_class()
+        names = list(serializer_class(**self.get_fieldset()).fields)
+        sources = serializer_class.field_sources
+        model_fields = {field.name for field in Product._meta.concrete_fields}
+        # Ordering and the keyset cursor read these, whatever is serialized.
+        columns = {'id', 'created_at', 'price', 'rating_count', 'rating_sum'}
+        for name in names:
+            columns.update(sources.get(name, (name,) if name in model_fields else ()))
+
+        related = [
+            relation for relation in ('category', 'vendor')
+            if any(column.startswith(f'{relation}__') for column in columns)
+        ]
+        if related:
+            queryset = queryset.select_related(*related)
+            columns.update(related)
+        prefetches = [name for name in ('images', 'variants') if name in names]
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if {'thumbnail', 'thumbnail_srcset'} & set(names) and 'images' not in names:
+            queryset = queryset.with_thumbnail()
+        return queryset.only(*columns)
+
+    def get_cache_tags(self, request, data):
+        # Any product write can change which products a listing contains, so
+        # listings also depend on the collection-wide 'product-list' tag.
+        tags = set() if self.action == 'retrieve' else {'product-list'}
+        if self.action == 'related':
+            tags.add(RELATED_PRODUCTS)
+        elif self.action == 'similar':
+            tags.add(SIMILAR_PRODUCTS)
+        for row in response_rows(data):
+            tags.add(f"product:{row['id']}")
+            if row.get('category') is not None:
+                tags.add(f"category:{row['category']}")
+            if row.get('vendor') is not None:
+                tags.add(f"vendor:{row['vendor']}")
+        return tags
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet counts for the products matching the current search and filters"""
+        key = facet_cache_key(request.query_params)
+        data = cache.get(key)
+        if data is None:
+            data = compute_product_facets(self.filter_queryset(self.get_queryset()))
+            cache.set(key, data, PRODUCT_FACETS_TIMEOUT)
+        return Response(data)
+
     @action(detail=False, methods=['get'])
+    @cache_response
     def featured(self, request):
-        featured_products = Product.objects.filter(
+        featured_products = self.get_queryset().filter(
             featured=True,
             is_active=True,
             approval_status='approved'
@@ -358,6 +543,31 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(featured_products, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    @cache_response
+    def related(self, request, pk=None):
+        """Products most often bought together with this one, ranked by
+        ``manage.py build_recommendations``."""
+        related_products = self.get_queryset().filter(
+            recommended_in__product=pk,
+            recommended_in__rank__isnull=False,
+            is_active=True,
+            approval_status='approved'
+        ).order_by('recommended_in__rank')[:8]
+        serializer = self.get_serializer(related_products, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    @cache_response
+    def similar(self, request, pk=None):
+        """Products whose name, description and category read most like this
+        one's, from the index ``manage.py build_similarity_index`` maintains."""
+        ids = similar_products(pk)
+        products = {product.pk: product for product in self.get_queryset().filter(pk__in=ids)}
+        ranked = [products[product_id] for product_id in ids if product_id in products]
+        serializer = self.get_serializer(ranked, many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         if not request.user.is_staff:
@@ -370,7 +580,75 @@ class ProductViewSet(viewsets.ModelViewSet):
         product.save()
         return Response({"detail": "Product approved successfully."})
 
-class OrderViewSet(viewsets.ModelViewSet):
+class AutocompleteView(APIView):
+    """``?q=`` prefix suggestions for the search box, from the memory-mapped
+    index in app.autocomplete (no database query)."""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 25)
+        except ValueError:
+            limit = 10
+        response = Response(autocomplete.suggest(request.query_params.get('q', ''), limit))
+        patch_cache_control(response, public=True, max_age=60)
+        return response
+
+class GuestCartView(APIView):
+    """The cart of a visitor who is not logged in, kept in the cache by
+    app.carts.GuestCart. The client sends back the token it receives in the
+    ``X-Guest-Cart`` response header; login merges the cart into the user's."""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get_guest_cart(self):
+        return carts.GuestCart(self.request.headers.get(carts.GUEST_CART_HEADER))
+
+    def respond(self, guest, status_code=status.HTTP_200_OK):
+        response = Response(CartSerializer(guest).data, status=status_code)
+        if guest.token:
+            response[carts.GUEST_CART_HEADER] = guest.token
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+
+    def get(self, request):
+        return self.respond(self.get_guest_cart())
+
+    def delete(self, request):
+        guest = self.get_guest_cart()
+        guest.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class GuestCartItemsView(GuestCartView):
+    """``POST`` adds ``{"items": [...]}`` lines to the guest cart, ``PUT``
+    replaces its lines."""
+
+    def post(self, request):
+        return self.write(request, replace=False)
+
+    def put(self, request):
+        return self.write(request, replace=True)
+
+    def write(self, request, replace):
+        serializer = CartLinesSerializer(data=request.data)
+        if replace:
+            serializer.fields['items'].allow_empty = True
+        serializer.is_valid(raise_exception=True)
+        lines = serializer.validated_data['items']
+        errors = carts.line_errors(lines) if lines else None
+        if errors:
+            return Response({'items': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        guest = self.get_guest_cart()
+        if replace:
+            guest.replace(lines)
+        else:
+            guest.add(lines)
+        guest.save()
+        return self.respond(guest, status.HTTP_200_OK if replace else status.HTTP_201_CREATED)
+
+class OrderViewSet(IdempotentCreateMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
@@ -407,7 +685,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         order.save()
         return Response({'message': f'Order status updated to {new_status}'})
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
 
@@ -428,60 +706,93 @@ class TransactionViewSet(viewsets.ModelViewSet):
             )
 
         transaction = self.get_object()
-        transaction.admin_approved = True
-        transaction.admin_note = request.data.get('note', '')
-        transaction.save()
-
-        # Create vendor earnings
-        for item in transaction.order.items.all():
-            VendorEarning.objects.create(
-                vendor=item.product.vendor,
-                order_item=item,
-                amount=item.vendor_earning
+        approve_transactions([transaction.pk], request.data.get('note', ''))
+        return Response({'message': 'Payment approved and vendor earnings created'})
+
+    @action(detail=False, methods=['post'])
+    def approve_payments(self, request):
+        """Approve ``{"transactions": [ids], "note": ""}`` in one go, creating
+        the missing vendor earnings in bulk (see app.payments)."""
+        if not request.user.is_administrator:
+            return Response(
+                {'error': 'Only administrators can approve payments'},
+                status=status.HTTP_403_FORBIDDEN
             )
 
-        return Response({'message': 'Payment approved and vendor earnings created'})
+        serializer = PaymentApprovalSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['transactions']
+        approved, earnings = approve_transactions(ids, serializer.validated_data['note'])
+        return Response({
+            'approved': approved,
+            'missing': sorted(set(ids) - set(approved)),
+            'earnings_created': earnings,
+        })
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    # Cart rows are touched whenever an item changes; item subtotals also
+    # depend on the current product prices.
+    last_modified_fields = ('updated_at', 'items__product__updated_at')
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):  # handle schema generation
             return Cart.objects.none()
-        return Cart.objects.filter(user=self.request.user)
+        queryset = Cart.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_items()
+        return queryset
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def add_item(self, request, pk=None):
         cart = self.get_object()
-        product_id = request.data.get('product')
-        quantity = request.data.get('quantity', 1)
-        variant_id = request.data.get('variant')
-
-        try:
-            product = Product.objects.get(pk=product_id)
-            if variant_id:
-                variant = ProductVariant.objects.get(pk=variant_id)
-            else:
-                variant = None
-
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                variant=variant,
-                defaults={'quantity': quantity}
-            )
-
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
-
-            return Response({'message': 'Item added to cart'})
-        except (Product.DoesNotExist, ProductVariant.DoesNotExist):
+        serializer = CartLineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if carts.add_items(cart, [serializer.validated_data]):
             return Response(
                 {'error': 'Product or variant not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response({'message': 'Item added to cart'})
+
+    @action(detail=True, methods=['post'], url_path='items')
+    @idempotent
+    def add_items(self, request, pk=None):
+        """Add a batch of ``{product, variant, quantity}`` lines in one
+        transaction (e.g. a guest cart on login); all or nothing."""
+        cart = self.get_object()
+        serializer = CartLinesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        errors = carts.add_items(cart, serializer.validated_data['items'])
+        if errors:
+            return Response({'items': errors}, status=status.HTTP_400_BAD_REQUEST)
+        cart = Cart.objects.filter(pk=cart.pk).with_items().get()
+        return Response(CartSerializer(cart).data)
+
+    @action(detail=True, methods=['post', 'delete'])
+    def reserve(self, request, pk=None):
+        """Hold the stock for the cart's contents for
+        ``settings.STOCK_RESERVATION_TTL`` seconds (``DELETE`` gives it back);
+        checkout uses the held units."""
+        cart = self.get_object()
+        if request.method == 'DELETE':
+            reservations.release(cart.reservations.all())
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        expires_at = reservations.reserve_cart(cart)
+        return Response({'expires_at': expires_at}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def checkout(self, request, pk=None):
+        """Place an order for the cart's contents at current prices, taking
+        the stock in the same transaction (see app.checkout)."""
+        cart = self.get_object()
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = place_order(cart, **serializer.validated_data)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 class WishlistViewSet(viewsets.ModelViewSet):
     serializer_class = WishlistSerializer
@@ -552,12 +863,58 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]  # Allow public read access
     lookup_field = 'slug'
+    pagination_class = None  # The category menu needs the whole tree at once
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated(), IsAdministrator()]
         return [permissions.AllowAny()]
 
+    def _render_tree(self, request, roots_only):
+        """Serialize the whole category tree from one ordered query, cached
+        until a category is saved, moved or deleted."""
+        key = caching.versioned_key(
+            caching.CATEGORY_TREE,
+            'roots' if roots_only else 'all',
+            request.build_absolute_uri('/'),
+        )
+        data = cache.get(key)
+        if data is None:
+            # TreeManager orders by (tree_id, lft), so parents precede children.
+            nodes = list(Category.objects.with_product_counts(Category.objects.all()))
+            roots = get_cached_trees(nodes)
+            serializer = self.get_serializer(roots if roots_only else nodes, many=True)
+            data = serializer.data
+            cache.set(key, data, caching.CATEGORY_TREE_TIMEOUT)
+        return Response(data)
+
+    def get_cache_tags(self, request, data):
+        tags = {'category-list'} if self.action != 'retrieve' else set()
+        nodes = list(response_rows(data))
+        while nodes:
+            node = nodes.pop()
+            tags.add(f"category:{node['id']}")
+            nodes.extend(node.get('children') or [])
+        return tags
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return self._render_tree(request, roots_only=False)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        category = self.get_object()
+        subtree = Category.objects.with_product_counts(
+            category.get_descendants(include_self=True)
+        ).get_cached_trees()[0]
+        return Response(self.get_serializer(subtree).data)
+
+    @action(detail=False, methods=['get'])
+    @cache_response
+    def tree(self, request):
+        """Nested category tree starting from the root categories"""
+        return self._render_tree(request, roots_only=True)
+
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -570,4 +927,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
 class IsOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user.is_staff or obj.user == request.user
\ No newline at end of file
+        return request.user.is_staff or obj.user == request.user
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """Development media server; content-addressed files never change."""
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_blob(path):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
@@ -103,10 +103,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLite cannot upgrade a transaction that has read to a write while
+        # another writer holds the lock, and ignores select_for_update(). So
+        # transactions take the write lock up front, and concurrent writers
+        # (checkouts racing for stock, say) queue for it instead of failing
+        # with "database is locked".
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        # A file, not the in-memory default, so tests can share the test
+        # database between threads (see app/tests/test_checkout.py).
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
 
+# Cache
+# Per-process memory by default. Point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) in production so
+# cache invalidations reach every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'tes-market'),
+        'TIMEOUT': 300,
+    }
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -157,6 +182,46 @@ for dir_name in MEDIA_DIRS:
     if not dir_path.exists():
         dir_path.mkdir(parents=True, exist_ok=True)
 
+# Uploads are streamed to temporary files with per-field limits (see app/uploads.py)
+FILE_UPLOAD_HANDLERS = ['app.uploads.StreamingUploadHandler']
+UPLOAD_MAX_REQUEST_BYTES = 210 * 1024 * 1024
+UPLOAD_LIMITS = {
+    'default': {
+        'max_bytes': 10 * 1024 * 1024,
+        'types': ('image/jpeg', 'image/png', 'image/gif', 'image/webp'),
+    },
+    # Bulk product import/sync feeds (CSV / JSON Lines)
+    'file': {'max_bytes': 200 * 1024 * 1024, 'types': None},
+}
+
+# Resized/WebP copies of uploaded images (see app/images.py)
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', 2))
+
+# Anonymous carts live in the cache (see app/carts.py) for this long after
+# their last change
+GUEST_CART_TTL = 7 * 24 * 60 * 60
+
+# How long POST /api/cart/<id>/reserve/ holds stock (see app/reservations.py);
+# run `manage.py release_expired_reservations --interval 60` to give back
+# expired holds
+STOCK_RESERVATION_TTL = 15 * 60
+
+# Successful responses to POSTs sent with an Idempotency-Key header are
+# replayed to retries for this long. A retry racing the first request waits
+# up to IDEMPOTENCY_KEY_WAIT seconds for it, and a request unfinished after
+# IDEMPOTENCY_KEY_LEASE seconds is taken to have died (see app/idempotency.py)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_KEY_WAIT = 10
+IDEMPOTENCY_KEY_LEASE = 3 * IDEMPOTENCY_KEY_WAIT
+
+# Prefix autocomplete snapshot, memory-mapped by every worker process (see app/autocomplete.py)
+AUTOCOMPLETE_INDEX_PATH = Path(os.environ.get('AUTOCOMPLETE_INDEX_PATH', BASE_DIR / 'var' / 'autocomplete.idx'))
+# Saves go to a small delta segment, merged into the snapshot once it holds
+# this many entries or the snapshot is this many seconds old
+AUTOCOMPLETE_DELTA_MAX_ENTRIES = 20000
+AUTOCOMPLETE_MERGE_INTERVAL = 15 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -185,7 +250,14 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'app.uploads.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'app.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
 # JWT Settings
@@ -232,7 +304,7 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
 ]
 
-CORS_EXPOSE_HEADERS = ['Content-Type', 'Authorization']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'Authorization', 'Idempotent-Replayed', 'X-Guest-Cart']
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOW_CREDENTIALS = True
 
@@ -250,9 +322,11 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
+    'x-guest-cart',
     'x-requested-with',
 ]
 
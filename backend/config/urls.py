@@ -12,6 +12,7 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 from django.views.generic import TemplateView
+from app.views import serve_media
 
 # API Documentation Schema
 schema_view = get_schema_view(
@@ -51,7 +52,7 @@ urlpatterns = [
 
 # Serve static files during development and production
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 urlpatterns += [
@@ -3,4 +3,37 @@ import { twMerge } from "tailwind-merge"
  
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
-}
\ No newline at end of file
+}
+// List endpoints are paginated ({ next, previous, results }); unpaginated
+// ones still return a bare array.
+export function listResults<T = any>(data: any): T[] {
+  if (Array.isArray(data)) return data
+  return Array.isArray(data?.results) ? data.results : []
+}
+
+// Pages followed by allResults(): management screens show at most this many
+// pages (20 rows each by default) rather than fetching a table without bound.
+export const MAX_LIST_PAGES = 25
+
+// Every row of a paginated list, following `next` links from the first
+// response through `get` (the axios instance that made it).
+export async function allResults<T = any>(
+  response: { data: any },
+  get: (url: string) => Promise<{ data: any }>,
+  maxPages = MAX_LIST_PAGES,
+): Promise<T[]> {
+  const results = listResults<T>(response.data)
+  let next = Array.isArray(response.data) ? null : response.data?.next
+  for (let page = 1; next && page < maxPages; page++) {
+    const { data } = await get(next)
+    results.push(...listResults<T>(data))
+    next = data?.next
+  }
+  return results
+}
+
+// `next` link of a paginated list page, as getNextPageParam for
+// useInfiniteQuery (undefined once there are no more pages).
+export function nextPage(data: any): string | undefined {
+  return Array.isArray(data) ? undefined : data?.next ?? undefined
+}
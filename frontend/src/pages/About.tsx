@@ -3,6 +3,7 @@ import FadeIn from '@/components/animations/FadeIn';
 import ScrollReveal from '@/components/animations/ScrollReveal';
 import { useQuery } from '@tanstack/react-query';
 import { aboutAPI } from '@/services/api';
+import { listResults } from '@/lib/utils';
 
 interface About {
   id: number;
@@ -16,7 +17,7 @@ const About = () => {
     queryKey: ['about'],
     queryFn: async () => {
       const response = await aboutAPI.getAll();
-      return Array.isArray(response.data) ? response.data : [];
+      return listResults(response.data);
     },
   });
 
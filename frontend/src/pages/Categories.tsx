@@ -5,13 +5,14 @@ import { FolderTree, ShoppingBag } from 'lucide-react';
 import { categoriesAPI } from '@/services/api';
 import { Category } from '@/types';
 import FadeIn from '@/components/animations/FadeIn';
+import { listResults } from '@/lib/utils';
 
 const Categories = () => {
   const { data: categoriesData, error: categoriesError } = useQuery<Category[]>({
     queryKey: ['categories'],
     queryFn: async () => {
       const response = await categoriesAPI.getAll();
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return listResults(response.data); // Ensure this returns an array
     },
   });
 
@@ -12,13 +12,14 @@ import { useQuery } from '@tanstack/react-query';
 import 'swiper/css';
 import 'swiper/css/pagination';
 import 'swiper/css/navigation';
+import { listResults } from '@/lib/utils';
 
 const Home = () => {
   const { data: featuredProducts } = useQuery<Product[]>({
     queryKey: ['featured-products'],
     queryFn: async () => {
       const response = await productsAPI.getFeatured();
-      return Array.isArray(response.data) ? response.data : [];
+      return listResults(response.data);
     },
   });
 
@@ -26,7 +27,7 @@ const Home = () => {
     queryKey: ['categories'],
     queryFn: async () => {
       const response = await categoriesAPI.getAll();
-      return Array.isArray(response.data) ? response.data : [];
+      return listResults(response.data);
     },
   });
 
@@ -34,7 +35,7 @@ const Home = () => {
     queryKey: ['testimonials'],
     queryFn: async () => {
       const response = await testimonialsAPI.getAll();
-      return Array.isArray(response.data) ? response.data : [];
+      return listResults(response.data);
     },
   });
 
@@ -43,16 +43,15 @@ const ProductDetails = () => {
   });
 
   // Fetch product details
-  const { data: productData, error: productError } = useQuery<Product[]>({
-    queryKey: ['products'],
+  const { data: product, error: productError } = useQuery<Product | null>({
+    queryKey: ['product', slug],
     queryFn: async () => {
-      const response = await productsAPI.getAll();
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      const response = await productsAPI.getBySlug(slug!);
+      return response ? response.data : null;
     },
+    enabled: !!slug,
   });
 
-  const product = productData?.find((product) => product.slug === slug);
-
   // Fetch product reviews
   const { data: reviews, isLoading: reviewsLoading } = useQuery<Review[]>({
     queryKey: ['reviews', slug],
@@ -1,13 +1,14 @@
 import { useState, useEffect } from 'react';
-import { useQuery } from '@tanstack/react-query';
+import { useQuery, useInfiniteQuery } from '@tanstack/react-query';
 import { Link, useLocation } from 'react-router-dom';
 import { Search, Filter, ShoppingCart, Heart, Star } from 'lucide-react';
-import { productsAPI, categoriesAPI } from '@/services/api';
+import api, { productsAPI, categoriesAPI } from '@/services/api';
 import { Product, Category } from '@/types';
 import { useDispatch } from 'react-redux';
 import { addItem } from '@/store/slices/cartSlice';
 import { useToast } from '@/components/ui/use-toast';
 import FadeIn from '@/components/animations/FadeIn';
+import { listResults, nextPage } from '@/lib/utils';
 
 const Products = () => {
   const location = useLocation();
@@ -33,14 +34,26 @@ const Products = () => {
     queryKey: ['categories'],
     queryFn: async () => {
       const response = await categoriesAPI.getAll();
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return listResults(response.data); // Ensure this returns an array
     },
   });
 
-  // Fetch products with filters
-  const { data: productsData } = useQuery<Product[]>({
+  // Fetch products with filters, a page at a time: later pages follow the
+  // list's `next` link
+  const {
+    data: productPages,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
     queryKey: ['products', searchTerm, selectedCategory, priceRange, sortBy],
-    queryFn: async () => {
+    initialPageParam: null as string | null,
+    getNextPageParam: nextPage,
+    queryFn: async ({ pageParam }) => {
+      if (pageParam) {
+        const response = await api.get(pageParam);
+        return response.data;
+      }
       const params: Record<string, any> = {};
       
       if (searchTerm) params.search = searchTerm;
@@ -52,9 +65,10 @@ const Products = () => {
       params.max_price = priceRange[1];
       
       const response = await productsAPI.getAll(params);
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return response.data;
     },
   });
+  const productsData = productPages?.pages.flatMap((page) => listResults<Product>(page));
 
   const handleAddToCart = (product: Product) => {
     dispatch(
@@ -194,7 +208,7 @@ const Products = () => {
       {Array.isArray(productsData) && productsData.length > 0 ? (
         <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">
           {productsData.map((product, index) => (
-            <FadeIn key={product.id} delay={index * 0.05} direction="up">
+            <FadeIn key={product.id} delay={(index % 20) * 0.05} direction="up">
               <div className="bg-white rounded-lg shadow-md overflow-hidden hover-card">
                 <Link to={`/products/${product.slug}`} className="block">
                   <div className="aspect-w-1 aspect-h-1">
@@ -255,6 +269,18 @@ const Products = () => {
       ) : (
         <p>No products found.</p>
       )}
+
+      {hasNextPage && (
+        <div className="mt-8 flex justify-center">
+          <button
+            onClick={() => fetchNextPage()}
+            disabled={isFetchingNextPage}
+            className="px-6 py-2 bg-gray-100 text-gray-700 rounded-lg hover:bg-gray-200 disabled:opacity-50"
+          >
+            {isFetchingNextPage ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
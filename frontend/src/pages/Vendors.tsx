@@ -1,18 +1,28 @@
 import React from 'react';
-import { useQuery } from '@tanstack/react-query';
+import { useInfiniteQuery } from '@tanstack/react-query';
 import { Link } from 'react-router-dom';
 import { Store, Star, Package, ShoppingBag, Check } from 'lucide-react';
 import api from '@/lib/axios';
 import { User } from '@/types';
 import FadeIn from '@/components/animations/FadeIn';
+import { listResults, nextPage } from '@/lib/utils';
 
 const Vendors = () => {
-  const { data: vendorsData, error: vendorsError } = useQuery<User[]>({
+  // A page at a time; later pages follow the list's `next` link
+  const {
+    data: vendorPages,
+    error: vendorsError,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
     queryKey: ['vendors'],
-    queryFn: async () => {
+    initialPageParam: '/users/?user_type=vendor&is_verified=true',
+    getNextPageParam: nextPage,
+    queryFn: async ({ pageParam }) => {
       try {
-        const response = await api.get('/users/?user_type=vendor&is_verified=true');
-        return Array.isArray(response.data) ? response.data : [];
+        const response = await api.get(pageParam);
+        return response.data;
       } catch (error) {
         if (error.response) {
           if (error.response.status === 401) {
@@ -34,7 +44,7 @@ const Vendors = () => {
     );
   }
 
-  const vendors = vendorsData;
+  const vendors = vendorPages?.pages.flatMap((page) => listResults<User>(page));
 
   if (!vendors) {
     return (
@@ -55,7 +65,7 @@ const Vendors = () => {
 
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-8">
         {vendors?.map((vendor, index) => (
-          <FadeIn key={vendor.id} delay={index * 0.1}>
+          <FadeIn key={vendor.id} delay={(index % 20) * 0.1}>
             <div className="bg-white rounded-lg shadow-md overflow-hidden hover:shadow-xl transition-shadow">
               <div className="p-6">
                 <div className="flex items-center mb-4">
@@ -111,6 +121,18 @@ const Vendors = () => {
           </FadeIn>
         ))}
       </div>
+
+      {hasNextPage && (
+        <div className="mt-12 flex justify-center">
+          <button
+            onClick={() => fetchNextPage()}
+            disabled={isFetchingNextPage}
+            className="px-6 py-2 bg-gray-100 text-gray-700 rounded-lg hover:bg-gray-200 disabled:opacity-50"
+          >
+            {isFetchingNextPage ? 'Loading...' : 'Load more vendors'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -1,9 +1,10 @@
 import { useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { User, Search, UserX, UserCheck, Mail, Phone } from 'lucide-react';
-import { adminAPI } from '@/services/api';
+import api, { adminAPI } from '@/services/api';
 import { User as UserType } from '@/types';
 import { useToast } from '@/components/ui/use-toast';
+import { allResults } from '@/lib/utils';
 
 const ManageUsers = () => {
   const [searchTerm, setSearchTerm] = useState('');
@@ -14,7 +15,7 @@ const ManageUsers = () => {
     queryKey: ['admin-users', searchTerm],
     queryFn: async () => {
       const response = await adminAPI.getUsers(searchTerm);
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return allResults(response, (url) => api.get(url));
     },
   });
 
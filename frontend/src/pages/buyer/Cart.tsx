@@ -7,6 +7,7 @@ import { removeItem, updateQuantity, setCart, setLoading } from '@/store/slices/
 import { cartAPI } from '@/services/api';
 import { useToast } from '@/components/ui/use-toast';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { listResults } from '@/lib/utils';
 
 const Cart = () => {
   const dispatch = useDispatch();
@@ -20,7 +21,7 @@ const Cart = () => {
     queryKey: ['cart'],
     queryFn: async () => {
       const response = await cartAPI.getAll();
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return listResults(response.data); // Ensure this returns an array
     },
     enabled: isAuthenticated,
     onSuccess: (data) => {
@@ -3,13 +3,14 @@ import { useQuery } from '@tanstack/react-query';
 import { Package } from 'lucide-react';
 import api from '@/lib/axios';
 import { Order } from '@/types';
+import { allResults } from '@/lib/utils';
 
 const Orders = () => {
   const { data: orderData, error: orderError } = useQuery<Order[]>({
     queryKey: ['orders'],
     queryFn: async () => {
       const response = await api.get('/orders/');
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return allResults(response, (url) => api.get(url));
     },
   });
 
@@ -9,6 +9,7 @@ import api from '@/lib/axios';
 import { useToast } from '@/components/ui/use-toast';
 import { useQuery } from 'react-query';
 import { profileAPI } from '@/services/api';
+import { listResults } from '@/lib/utils';
 
 // Define the Profile type
 interface Profile {
@@ -37,7 +38,7 @@ const Profile = () => {
     queryKey: ['profile'],
     queryFn: async () => {
       const response = await profileAPI.get();
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return listResults(response.data); // Ensure this returns an array
     },
     onError: (error) => {
       toast({
@@ -7,6 +7,7 @@ import { useToast } from '@/components/ui/use-toast';
 import { WishlistItem } from '@/types';
 import { useDispatch } from 'react-redux';
 import { addItem } from '@/store/slices/cartSlice';
+import { listResults } from '@/lib/utils';
 
 const Wishlist = () => {
   const { toast } = useToast();
@@ -17,7 +18,7 @@ const Wishlist = () => {
     queryKey: ['wishlist'],
     queryFn: async () => {
       const response = await wishlistAPI.getAll();
-      return Array.isArray(response.data) ? response.data : []; // Ensure this returns an array
+      return listResults(response.data); // Ensure this returns an array
     },
   });
 
@@ -198,8 +198,16 @@ export const productsAPI = {
   getAll: (params?: any) =>
     api.get('/api/products/', { params }),
   
-  getById: (slug: string) =>
-    api.get(`/api/products/${slug}/`),
+  getById: (id: string) =>
+    api.get(`/api/products/${id}/`),
+
+  // Detail routes take the id, so the slug is resolved through the list first.
+  getBySlug: async (slug: string) => {
+    const { data } = await api.get('/api/products/', { params: { slug, fields: 'id' } });
+    const [match] = data?.results ?? data ?? [];
+    if (!match) return null;
+    return api.get(`/api/products/${match.id}/`);
+  },
   
   getFeatured: () =>
     api.get('/api/products/featured/'),